@@ -4,6 +4,7 @@ Robust Fabric Name Matcher
 Matches fabric names extracted from invoices with database entries using multiple algorithms.
 """
 
+import functools
 import os
 import re
 import sys
@@ -56,8 +57,9 @@ class MatchResult:
     price_difference_percent: Optional[float]
 
 # ========== String Normalization ==========
+@functools.lru_cache(maxsize=65536)
 def normalize_string(s: str) -> str:
-    """Normalize string for better matching"""
+    """Normalize string for better matching (memoized; the same DB names are normalized repeatedly)"""
     if not s:
         return ""
     
@@ -89,6 +91,18 @@ def tokenize_string(s: str) -> List[str]:
     tokens = [token for token in s.split() if len(token) >= 2]
     return tokens
 
+# Common prefix patterns in the database ("A - ", "H - ", "S - ", then "Home", "Sujan",
+# "Agora"), stripped in order by prefix_based_match before comparing
+_DB_PREFIX_PATTERNS = [
+    re.compile(r'^[a-z]\s*-\s*', re.I),
+    re.compile(r'^[a-z]+\s*', re.I),
+]
+
+def strip_db_prefix(db_name: str) -> str:
+    for pattern in _DB_PREFIX_PATTERNS:
+        db_name = pattern.sub('', db_name)
+    return db_name
+
 # ========== Matching Algorithms ==========
 class FabricMatcher:
     """Robust fabric name matcher using multiple algorithms"""
@@ -96,6 +110,9 @@ class FabricMatcher:
     def __init__(self, database_fabrics: List[DatabaseFabric]):
         self.database_fabrics = database_fabrics
         self.db_index = self._build_index()
+        # Per-entry data the string algorithms need on every query, computed once
+        self.db_tokens = {db_name: set(tokenize_string(db_name)) for db_name in self.db_index}
+        self.db_names_clean = {db_name: strip_db_prefix(db_name) for db_name in self.db_index}
         
     def _build_index(self) -> Dict[str, DatabaseFabric]:
         """Build normalized index of database fabrics"""
@@ -122,7 +139,7 @@ class FabricMatcher:
         best_score = 0.0
         
         for db_name, fabric in self.db_index.items():
-            db_tokens = set(tokenize_string(db_name))
+            db_tokens = self.db_tokens[db_name]
             
             # Enhanced substring matching for prefix-based naming
             # Check if parsed name is contained in database name (most common case)
@@ -211,7 +228,7 @@ class FabricMatcher:
         patterns = {'striped', 'checked', 'floral', 'geometric', 'solid', 'print', 'embroidery'}
         
         for db_name, fabric in self.db_index.items():
-            db_tokens = tokenize_string(db_name)
+            db_tokens = self.db_tokens[db_name]
             
             score = 0.0
             total_keywords = 0
@@ -254,20 +271,11 @@ class FabricMatcher:
         best_match = None
         best_score = 0.0
         
-        # Common prefix patterns in your database
-        prefix_patterns = [
-            r'^[a-z]\s*-\s*',  # "A - ", "H - ", "S - "
-            r'^[a-z]+\s*',     # "Home", "Sujan", "Agora"
-        ]
-        
         for db_name, fabric in self.db_index.items():
-            db_tokens = set(tokenize_string(db_name))
+            db_tokens = self.db_tokens[db_name]
             
-            # Remove common prefixes for comparison
-            db_name_clean = db_name
-            for pattern in prefix_patterns:
-                import re
-                db_name_clean = re.sub(pattern, '', db_name_clean, flags=re.IGNORECASE)
+            # Database name with common prefixes removed, for comparison
+            db_name_clean = self.db_names_clean[db_name]
             
             # Check if parsed name matches the cleaned database name
             if normalized_parsed in db_name_clean or db_name_clean in normalized_parsed:
@@ -339,6 +347,12 @@ class FabricMatcher:
         # No match found
         return self._create_match_result(parsed_fabric, None, 0.0, "NO_MATCH", "NO_MATCH")
     
+    def rematch(self, parsed_fabric: ParsedFabric, cached: MatchResult) -> MatchResult:
+        """Result for parsed_fabric reusing cached, the match_fabric result of a fabric
+        with the same name; price metrics are recomputed from parsed_fabric's rate"""
+        return self._create_match_result(parsed_fabric, cached.database_fabric, cached.match_score,
+                                         cached.match_algorithm, cached.confidence_level)
+    
     def _create_match_result(self, parsed_fabric: ParsedFabric, db_fabric: Optional[DatabaseFabric], 
                            score: float, algorithm: str, confidence: str) -> MatchResult:
         """Create match result with calculated metrics"""
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+JSON decoding of HTTP responses, shared by the API test scripts
+"""
+
+try:
+    import orjson  # faster decoding of large analysis payloads
+except ImportError:
+    orjson = None
+
+def parse_json(response):
+    """Decode a requests response's JSON body, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
@@ -35,23 +35,33 @@ def search_fabric_database():
     print(f"\n🔍 Searching for fabric patterns:")
     print("-" * 50)
     
+    # Lowercase every name once instead of once per pattern
+    lowered = [f.material_name.lower() for f in db_fabrics]
+    
     for pattern in search_patterns:
         print(f"\n📋 Searching for: '{pattern}'")
         
-        # Exact matches
-        exact_matches = [f for f in db_fabrics if pattern.lower() in f.material_name.lower()]
+        # Exact matches: keep only the preview, but count all of them
+        preview = []
+        total = 0
+        pl = pattern.lower()
+        for nl, f in zip(lowered, db_fabrics):
+            if pl in nl:
+                total += 1
+                if len(preview) < 3:
+                    preview.append(f)
         
         # Similar matches using difflib
         normalized_pattern = normalize_string(pattern)
         all_names = [normalize_string(f.material_name) for f in db_fabrics]
         similar_matches = get_close_matches(normalized_pattern, all_names, n=5, cutoff=0.6)
         
-        if exact_matches:
-            print(f"   ✅ Found {len(exact_matches)} exact matches:")
-            for match in exact_matches[:3]:  # Show first 3
+        if total:
+            print(f"   ✅ Found {total} exact matches:")
+            for match in preview:  # Show first 3
                 print(f"      - {match.material_name} | ₹{match.default_purchase_price}")
-            if len(exact_matches) > 3:
-                print(f"      ... and {len(exact_matches) - 3} more")
+            if total > 3:
+                print(f"      ... and {total - 3} more")
         else:
             print(f"   ❌ No exact matches found")
         
@@ -64,7 +74,7 @@ def search_fabric_database():
                     fabric = original_fabrics[0]
                     print(f"      - {fabric.material_name} | ₹{fabric.default_purchase_price}")
         
-        if not exact_matches and not similar_matches:
+        if not total and not similar_matches:
             print(f"   ⚠️ No matches found")
     
     # Show some sample fabric names from database
@@ -72,14 +82,14 @@ def search_fabric_database():
     print("-" * 50)
     
     # Show fabrics with "ROYAL" in name
-    royal_fabrics = [f for f in db_fabrics if "royal" in f.material_name.lower()]
+    royal_fabrics = [f for nl, f in zip(lowered, db_fabrics) if "royal" in nl]
     if royal_fabrics:
         print(f"   Fabrics with 'ROYAL':")
         for fabric in royal_fabrics[:5]:
             print(f"      - {fabric.material_name} | ₹{fabric.default_purchase_price}")
     
     # Show fabrics with "AGORA" in name
-    agora_fabrics = [f for f in db_fabrics if "agora" in f.material_name.lower()]
+    agora_fabrics = [f for nl, f in zip(lowered, db_fabrics) if "agora" in nl]
     if agora_fabrics:
         print(f"   Fabrics with 'AGORA':")
         for fabric in agora_fabrics[:5]:
@@ -34,18 +34,28 @@ def search_fabrics():
     print(f"\nSearching for fabric patterns:")
     print("-" * 50)
     
+    # Lowercase every name once instead of once per pattern
+    lowered = [f.material_name.lower() for f in db_fabrics]
+    
     for pattern in search_patterns:
         print(f"\nSearching for: '{pattern}'")
         
-        # Exact matches
-        exact_matches = [f for f in db_fabrics if pattern.lower() in f.material_name.lower()]
+        # Exact matches: keep only the preview, but count all of them
+        preview = []
+        total = 0
+        pl = pattern.lower()
+        for nl, f in zip(lowered, db_fabrics):
+            if pl in nl:
+                total += 1
+                if len(preview) < 5:
+                    preview.append(f)
         
-        if exact_matches:
-            print(f"   Found {len(exact_matches)} exact matches:")
-            for match in exact_matches[:5]:  # Show first 5
+        if total:
+            print(f"   Found {total} exact matches:")
+            for match in preview:  # Show first 5
                 print(f"      - {match.material_name} | Rs.{match.default_purchase_price}")
-            if len(exact_matches) > 5:
-                print(f"      ... and {len(exact_matches) - 5} more")
+            if total > 5:
+                print(f"      ... and {total - 5} more")
         else:
             print(f"   No exact matches found")
     
@@ -54,14 +64,14 @@ def search_fabrics():
     print("-" * 50)
     
     # Show fabrics with "ROYAL" in name
-    royal_fabrics = [f for f in db_fabrics if "royal" in f.material_name.lower()]
+    royal_fabrics = [f for nl, f in zip(lowered, db_fabrics) if "royal" in nl]
     if royal_fabrics:
         print(f"   Fabrics with 'ROYAL':")
         for fabric in royal_fabrics[:5]:
             print(f"      - {fabric.material_name} | Rs.{fabric.default_purchase_price}")
     
     # Show fabrics with "HOME" or "DDECOR" in name
-    home_fabrics = [f for f in db_fabrics if any(word in f.material_name.lower() for word in ["home", "ddecor"])]
+    home_fabrics = [f for nl, f in zip(lowered, db_fabrics) if "home" in nl or "ddecor" in nl]
     if home_fabrics:
         print(f"   Fabrics with 'HOME' or 'DDECOR':")
         for fabric in home_fabrics[:5]:
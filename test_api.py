@@ -4,33 +4,52 @@ Test script for the Invoice OCR Analysis API
 Tests all endpoints and functionality
 """
 
+import contextlib
+import io
 import requests
 import json
 import time
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from json_response import parse_json
+
 # API Configuration
 API_BASE_URL = "http://localhost:5001/api/v1"
 API_KEYS = {
     'admin': 'admin_api_key_12345',
     'team1': 'team1_api_key_67890'
 }
+HEADERS_TEAM1 = {'X-API-Key': API_KEYS['team1']}
+
+# Per-thread requests.Session (not documented as thread-safe), reused for
+# every call from that thread
+_local = threading.local()
+
+def _session():
+    """This thread's requests.Session, created on first use"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
 
-def test_health_check():
-    """Test health check endpoint"""
-    print("🔍 Testing Health Check...")
+def test_health_check(out=None):
+    """Test health check endpoint (output to out, default stdout)"""
+    print("🔍 Testing Health Check...", file=out)
     try:
-        response = requests.get(f"{API_BASE_URL}/health")
+        response = _session().get(f"{API_BASE_URL}/health")
         if response.status_code == 200:
-            data = response.json()
-            print(f"✅ Health Check: {data['status']}")
+            data = parse_json(response)
+            print(f"✅ Health Check: {data['status']}", file=out)
             return True
         else:
-            print(f"❌ Health Check failed: {response.status_code}")
+            print(f"❌ Health Check failed: {response.status_code}", file=out)
             return False
     except Exception as e:
-        print(f"❌ Health Check error: {e}")
+        print(f"❌ Health Check error: {e}", file=out)
         return False
 
 def test_analyze_invoice(api_key, file_path):
@@ -41,14 +60,14 @@ def test_analyze_invoice(api_key, file_path):
             files = {'file': f}
             headers = {'X-API-Key': api_key}
             
-            response = requests.post(
+            response = _session().post(
                 f"{API_BASE_URL}/analyze",
                 headers=headers,
                 files=files
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 if data.get('success'):
                     print(f"✅ Invoice Analysis: {data['summary']['overall_status']}")
                     print(f"   Items: {data['summary']['total_items']}, Matched: {data['summary']['matched_items']}")
@@ -68,29 +87,22 @@ def test_batch_analyze(api_key, file_paths):
     """Test batch invoice analysis"""
     print(f"🔍 Testing Batch Analysis...")
     try:
-        files = []
-        for path in file_paths:
-            if os.path.exists(path):
-                files.append(('files', open(path, 'rb')))
-        
-        if not files:
-            print("❌ No valid files found for batch analysis")
-            return False
-        
-        headers = {'X-API-Key': api_key}
-        
-        response = requests.post(
-            f"{API_BASE_URL}/batch-analyze",
-            headers=headers,
-            files=files
-        )
-        
-        # Close files
-        for _, f in files:
-            f.close()
+        with contextlib.ExitStack() as stack:
+            files = [('files', stack.enter_context(open(path, 'rb')))
+                     for path in file_paths if os.path.exists(path)]
+            
+            if not files:
+                print("❌ No valid files found for batch analysis")
+                return False
+            
+            response = _session().post(
+                f"{API_BASE_URL}/batch-analyze",
+                headers={'X-API-Key': api_key},
+                files=files
+            )
         
         if response.status_code == 200:
-            data = response.json()
+            data = parse_json(response)
             if data.get('success'):
                 print(f"✅ Batch Analysis: {data['successful_analyses']}/{data['total_files']} successful")
                 return True
@@ -110,10 +122,10 @@ def test_get_status(api_key):
     print(f"🔍 Testing Status Endpoint...")
     try:
         headers = {'X-API-Key': api_key}
-        response = requests.get(f"{API_BASE_URL}/status", headers=headers)
+        response = _session().get(f"{API_BASE_URL}/status", headers=headers)
         
         if response.status_code == 200:
-            data = response.json()
+            data = parse_json(response)
             print(f"✅ Status: User {data['user']}, Role {data['role']}")
             return True
         else:
@@ -128,10 +140,10 @@ def test_rate_limits(api_key):
     print(f"🔍 Testing Rate Limits...")
     try:
         headers = {'X-API-Key': api_key}
-        response = requests.get(f"{API_BASE_URL}/rate-limits", headers=headers)
+        response = _session().get(f"{API_BASE_URL}/rate-limits", headers=headers)
         
         if response.status_code == 200:
-            data = response.json()
+            data = parse_json(response)
             print(f"✅ Rate Limits: {data['current_usage']['last_minute']}/min, {data['current_usage']['last_hour']}/hour")
             return True
         else:
@@ -141,27 +153,27 @@ def test_rate_limits(api_key):
         print(f"❌ Rate limits error: {e}")
         return False
 
-def test_list_users(admin_api_key):
-    """Test list users endpoint (admin only)"""
-    print(f"🔍 Testing List Users (Admin)...")
+def test_list_users(admin_api_key, out=None):
+    """Test list users endpoint (admin only; output to out, default stdout)"""
+    print(f"🔍 Testing List Users (Admin)...", file=out)
     try:
         headers = {'X-API-Key': admin_api_key}
-        response = requests.get(f"{API_BASE_URL}/users", headers=headers)
+        response = _session().get(f"{API_BASE_URL}/users", headers=headers)
         
         if response.status_code == 200:
-            data = response.json()
-            print(f"✅ List Users: {data['total_users']} users found")
+            data = parse_json(response)
+            print(f"✅ List Users: {data['total_users']} users found", file=out)
             return True
         else:
-            print(f"❌ List users request failed: {response.status_code}")
+            print(f"❌ List users request failed: {response.status_code}", file=out)
             return False
     except Exception as e:
-        print(f"❌ List users error: {e}")
+        print(f"❌ List users error: {e}", file=out)
         return False
 
-def test_create_user(admin_api_key):
-    """Test create user endpoint (admin only)"""
-    print(f"🔍 Testing Create User (Admin)...")
+def test_create_user(admin_api_key, out=None):
+    """Test create user endpoint (admin only; output to out, default stdout)"""
+    print(f"🔍 Testing Create User (Admin)...", file=out)
     try:
         headers = {
             'X-API-Key': admin_api_key,
@@ -174,51 +186,49 @@ def test_create_user(admin_api_key):
             'role': 'user'
         }
         
-        response = requests.post(
+        response = _session().post(
             f"{API_BASE_URL}/users",
             headers=headers,
             json=user_data
         )
         
         if response.status_code == 201:
-            data = response.json()
-            print(f"✅ Create User: {data['message']}")
+            data = parse_json(response)
+            print(f"✅ Create User: {data['message']}", file=out)
             return True
         else:
-            print(f"❌ Create user request failed: {response.status_code}")
-            print(f"   Response: {response.text}")
+            print(f"❌ Create user request failed: {response.status_code}", file=out)
+            print(f"   Response: {response.text}", file=out)
             return False
     except Exception as e:
-        print(f"❌ Create user error: {e}")
+        print(f"❌ Create user error: {e}", file=out)
         return False
 
-def test_authentication():
-    """Test authentication with invalid API key"""
-    print(f"🔍 Testing Authentication...")
+def test_authentication(out=None):
+    """Test authentication with invalid API key (output to out, default stdout)"""
+    print(f"🔍 Testing Authentication...", file=out)
     try:
         headers = {'X-API-Key': 'invalid_key'}
-        response = requests.get(f"{API_BASE_URL}/status", headers=headers)
+        response = _session().get(f"{API_BASE_URL}/status", headers=headers)
         
         if response.status_code == 401:
-            print("✅ Authentication: Properly rejected invalid API key")
+            print("✅ Authentication: Properly rejected invalid API key", file=out)
             return True
         else:
-            print(f"❌ Authentication: Expected 401, got {response.status_code}")
+            print(f"❌ Authentication: Expected 401, got {response.status_code}", file=out)
             return False
     except Exception as e:
-        print(f"❌ Authentication error: {e}")
+        print(f"❌ Authentication error: {e}", file=out)
         return False
 
 def test_rate_limiting():
     """Test rate limiting by making multiple requests"""
     print(f"🔍 Testing Rate Limiting...")
     try:
-        headers = {'X-API-Key': API_KEYS['team1']}
-        
         # Make multiple requests quickly
         responses = []
         for i in range(5):
-            response = requests.get(f"{API_BASE_URL}/status", headers=headers)
+            response = _session().get(f"{API_BASE_URL}/status", headers=HEADERS_TEAM1)
             responses.append(response.status_code)
             time.sleep(0.1)  # Small delay
         
@@ -251,12 +261,27 @@ def main():
     # Test results
     results = []
     
-    # Test 1: Health Check
-    results.append(("Health Check", test_health_check()))
+    # Health, authentication and the admin probes don't use team1's key, so they
+    # run concurrently; each writes to its own buffer, printed in submission order
+    health_out, auth_out, admin_out = io.StringIO(), io.StringIO(), io.StringIO()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        # Test 1-2: Health Check, Authentication
+        health = pool.submit(test_health_check, health_out)
+        auth = pool.submit(test_authentication, auth_out)
+        
+        # Test 7: Admin Functions (the user is created after listing, in one worker)
+        admin_key = API_KEYS['admin']
+        admin = pool.submit(lambda: (test_list_users(admin_key, admin_out), test_create_user(admin_key, admin_out)))
+        
+        health_ok, auth_ok, (list_ok, create_ok) = health.result(), auth.result(), admin.result()
+    
+    for out in (health_out, auth_out, admin_out):
+        sys.stdout.write(out.getvalue())
     
-    # Test 2: Authentication
-    results.append(("Authentication", test_authentication()))
+    results.append(("Health Check", health_ok))
+    results.append(("Authentication", auth_ok))
     
+    # Test 3-6 share team1's key and its usage counters, so they run in order
     # Test 3: Status with valid API key
     results.append(("Status Endpoint", test_get_status(API_KEYS['team1'])))
     
@@ -271,9 +296,8 @@ def main():
     if len(test_files) > 1:
         results.append(("Batch Analysis", test_batch_analyze(API_KEYS['team1'], test_files[:2])))
     
-    # Test 7: Admin Functions
-    results.append(("List Users (Admin)", test_list_users(API_KEYS['admin'])))
-    results.append(("Create User (Admin)", test_create_user(API_KEYS['admin'])))
+    results.append(("List Users (Admin)", list_ok))
+    results.append(("Create User (Admin)", create_ok))
     
     # Test 8: Rate Limiting
     results.append(("Rate Limiting", test_rate_limiting()))
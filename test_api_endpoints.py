@@ -7,8 +7,11 @@ Tests all endpoints and helps debug issues
 import requests
 import json
 import os
+import tempfile
 from pathlib import Path
 
+from json_response import parse_json
+
 # API base URL
 BASE_URL = "http://localhost:5000"
 
@@ -77,15 +80,15 @@ def test_upload_endpoint_with_file():
     """Test upload endpoint with a test file"""
     print("🔍 Testing Upload Endpoint (With File)...")
     
-    # Create a simple test file
-    test_file_path = "test_invoice.txt"
     try:
-        with open(test_file_path, 'w') as f:
-            f.write("Test Invoice\nCompany: Test Corp\nAmount: $100.00\nGST: $10.00")
-        
-        # Test file upload
-        with open(test_file_path, 'rb') as f:
-            files = {'file': (test_file_path, f, 'text/plain')}
+        # Create a simple test file in the temp dir (tmpfs on most Linux hosts)
+        with tempfile.NamedTemporaryFile('w+b', suffix='.txt') as tf:
+            tf.write(b"Test Invoice\nCompany: Test Corp\nAmount: $100.00\nGST: $10.00")
+            tf.flush()
+            tf.seek(0)
+            
+            # Test file upload
+            files = {'file': (os.path.basename(tf.name), tf, 'text/plain')}
             response = requests.post(f"{BASE_URL}/upload", files=files)
         
         print(f"Status: {response.status_code}")
@@ -94,7 +97,7 @@ def test_upload_endpoint_with_file():
         
         # Try to parse as JSON
         try:
-            json_response = response.json()
+            json_response = parse_json(response)
             print("✅ Response is valid JSON")
             print(f"JSON Keys: {list(json_response.keys())}")
         except json.JSONDecodeError as e:
@@ -108,24 +111,20 @@ def test_upload_endpoint_with_file():
         print(f"❌ Error: {e}")
         print()
         return False
-    finally:
-        # Clean up test file
-        if os.path.exists(test_file_path):
-            os.remove(test_file_path)
 
 def test_test_ocr_endpoint():
     """Test the test-ocr endpoint"""
     print("🔍 Testing Test-OCR Endpoint...")
     
-    # Create a simple test file
-    test_file_path = "test_image.txt"
     try:
-        with open(test_file_path, 'w') as f:
-            f.write("Test Image Content\nOCR Test Data")
-        
-        # Test file upload
-        with open(test_file_path, 'rb') as f:
-            files = {'file': (test_file_path, f, 'text/plain')}
+        # Create a simple test file in the temp dir (tmpfs on most Linux hosts)
+        with tempfile.NamedTemporaryFile('w+b', suffix='.txt') as tf:
+            tf.write(b"Test Image Content\nOCR Test Data")
+            tf.flush()
+            tf.seek(0)
+            
+            # Test file upload
+            files = {'file': (os.path.basename(tf.name), tf, 'text/plain')}
             response = requests.post(f"{BASE_URL}/test-ocr", files=files)
         
         print(f"Status: {response.status_code}")
@@ -134,7 +133,7 @@ def test_test_ocr_endpoint():
         
         # Try to parse as JSON
         try:
-            json_response = response.json()
+            json_response = parse_json(response)
             print("✅ Response is valid JSON")
             print(f"JSON Keys: {list(json_response.keys())}")
         except json.JSONDecodeError as e:
@@ -148,10 +147,6 @@ def test_test_ocr_endpoint():
         print(f"❌ Error: {e}")
         print()
         return False
-    finally:
-        # Clean up test file
-        if os.path.exists(test_file_path):
-            os.remove(test_file_path)
 
 def test_cleanup_endpoint():
     """Test the cleanup endpoint"""
@@ -225,7 +220,7 @@ def test_specific_endpoint(endpoint):
         # Check if it's JSON
         if 'application/json' in response.headers.get('content-type', ''):
             try:
-                json_response = response.json()
+                json_response = parse_json(response)
                 print("✅ Valid JSON response")
             except json.JSONDecodeError as e:
                 print(f"❌ JSON parsing error: {e}")
@@ -8,17 +8,23 @@ DB schema expected (Supabase table default: materials_stage):
 
 Env:
   TESSERACT_CMD=/usr/bin/tesseract              # if tesseract isn't on PATH
+  TESSDATA_PREFIX=/path/to/tessdata_fast        # fast LSTM eng.traineddata (recommended)
   SUPABASE_URL=...
   SUPABASE_KEY=...
   DB_TABLE=materials_stage
   INVENTORY_CSV=/path/to/fallback.csv           # cols: material_name, default_purchase_price
   RATE_TOLERANCE_PCT=0.10                       # ±10% default
+  OCR_CACHE_DIR=.ocr_cache                      # extracted text cached by file hash
 """
 
-import os, re, sys, csv
+import os, re, io, sys, csv, functools, hashlib, tempfile, threading
+import multiprocessing
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Tuple, Dict, Set
 
 # --- OCR / PDF ---
 import fitz  # PyMuPDF
@@ -26,6 +32,18 @@ import cv2, numpy as np
 from PIL import Image
 import pytesseract
 
+# --- In-process Tesseract (optional; avoids a subprocess + temp file per page) ---
+try:
+    from tesserocr import PyTessBaseAPI  # type: ignore
+except Exception:
+    PyTessBaseAPI = None
+
+# --- Aho-Corasick format detection (optional; pip install pyahocorasick) ---
+try:
+    import ahocorasick  # type: ignore
+except Exception:
+    ahocorasick = None
+
 # --- Supabase (optional) ---
 try:
     from supabase import create_client as _sb_create_client  # type: ignore
@@ -33,10 +51,10 @@ except Exception:
     _sb_create_client = None
 
 # --- CSV Fabric Matching ---
-from difflib import SequenceMatcher
+from rapidfuzz import fuzz, process, utils
 
 
-@dataclass
+@dataclass(frozen=True)
 class TaxLine:
     tax: str                     # "IGST"
     rate_pct: Optional[float]    # e.g., 5.0
@@ -44,21 +62,23 @@ class TaxLine:
     line_text: str               # the original line (for debugging)
 
 
-@dataclass
+@dataclass(frozen=True)
 class TaxSummary:
     gst_rate: Optional[float] = None  # e.g., 5.0 for 5%
     cgst: Optional[float] = None
     sgst: Optional[float] = None
+    cgst_label: str = "CGST"          # "CGST SALES" when the invoice mentions SALES
+    sgst_label: str = "SGST"
 
 
-@dataclass
+@dataclass(frozen=True)
 class OutputIGST:
     label: str
     amount: Optional[float]
     line_text: str
 
 
-@dataclass
+@dataclass(frozen=True)
 class HomeIdeasTotals:
     sub_total: Optional[float] = None
     courier_charges: Optional[float] = None
@@ -71,6 +91,20 @@ class HomeIdeasTotals:
     total_inc_taxes: Optional[float] = None
 
 
+# (attribute, label) pairs printed in the tax summary, in invoice order
+_HOMEIDEAS_TOTAL_FIELDS = (
+    ("sub_total", "Sub Total"),
+    ("courier_charges", "Courier Charges"),
+    ("add_charges", "Add/Charges"),
+    ("taxable_value", "Taxable Value"),
+    ("tcs_amount", "TCS Amount"),
+    ("igst_amount", "IGST Amount"),
+    ("cgst_amount", "CGST Amount"),
+    ("sgst_amount", "SGST Amount"),
+    ("total_inc_taxes", "TOTAL INC. TAXES"),
+)
+
+
 def _fmt_money(v: Optional[float]) -> str:
     return f"₹{v:.2f}" if v is not None else "—"
 
@@ -81,55 +115,90 @@ def _wire_tesseract():
     if tcmd:
         pytesseract.pytesseract.tesseract_cmd = tcmd
 
+_NORM_SEP_RE = re.compile(r"[\s_]+")
+_NORM_DROP_RE = re.compile(r"[^a-z0-9 ]+")
+
+@functools.lru_cache(maxsize=8192)
 def _norm(s: str) -> str:
-    s = re.sub(r"[\s_]+", " ", s or "").strip().lower()
-    s = re.sub(r"[^a-z0-9 ]+", "", s)
-    return re.sub(r"\s+", " ", s)
+    s = _NORM_SEP_RE.sub(" ", s or "").strip().lower()
+    s = _NORM_DROP_RE.sub("", s)
+    return _WS_RE.sub(" ", s)
+
+class _NumKeep(dict):
+    """str.translate table keeping only decimal digits and '.' (same set as
+    [\d.]); each code point's verdict is computed once, then a dict hit."""
+    def __missing__(self, c):
+        ch = chr(c)
+        self[c] = keep = c if ch == "." or ch.isdecimal() else None
+        return keep
+
+_NUM_KEEP = _NumKeep()
 
 def _num(x) -> Optional[float]:
     if x is None: return None
-    s = re.sub(r"[^\d.]", "", str(x).replace(",", ""))
+    s = str(x).translate(_NUM_KEEP)
     try: return float(s) if s else None
     except: return None
 
+# Bracketed asides, e.g. "(blue)" / "[x]"
+_BRACKETS_RE = re.compile(r"\s*\([^)]*\)|\s*\[[^\]]*\]")
+
+# Noise patterns found in Sarom.pdf, fused into one alternation so the
+# description is scanned once instead of once per pattern
+_NOISE_PATTERNS = [
+    r"\b(GSTIN|GST|IGST|CGST|SGST|Tax|Total|Sub[- ]?total|Grand Total|Invoice|Bill|Address|Ship To|PIN|Pincode|Phone|Mobile|Email)\b",
+    r"[A-Z]{2}\d{2}[A-Z]{5}\d[A-Z]\d[A-Z]\d",  # GSTIN-like
+    r"\b\d{6}\b",
+    r"\b\d{1,2}\b",  # Single/double digit numbers (like line numbers)
+    r"\b5%\b",  # Tax percentages
+    r"\b[A-Z]{2}\d{2}[A-Z]{5}\d{2}\b",  # HSN codes like 55169200
+    r"\|\s*5%\s*\|",  # Tax percentage patterns
+    r"\|\s*5%:",  # Tax percentage patterns
+    r"\|\s*5%!",  # Tax percentage patterns
+    r"\|\s*5%\)",  # Tax percentage patterns
+    r"\|\s*5%i",  # Tax percentage patterns
+    r"§\d+",  # Section symbols with numbers
+    r"\$\d+",  # Dollar symbols with numbers
+    r"\"\d+",  # Quote symbols with numbers
+    r"~\d+",  # Tilde symbols with numbers
+    r"-\d+",  # Dash with numbers
+]
+_NOISE_RE = re.compile("|".join(f"(?:{p})" for p in _NOISE_PATTERNS), re.I)
+
+_WS_RE = re.compile(r"\s+")
+
+class _DropTable(dict):
+    """str.translate table deleting decimal digits, whitespace and ``extra``
+    (same set as [\d\s<extra>]); an empty result means the string was made
+    of nothing else."""
+    def __init__(self, extra: str = ""):
+        super().__init__((ord(ch), None) for ch in extra)
+
+    def __missing__(self, c):
+        ch = chr(c)
+        self[c] = keep = None if ch.isdecimal() or ch.isspace() else c
+        return keep
+
+# Numbers and money punctuation only, e.g. "₹ 1,200.50 /"
+_NUMERIC_ONLY_DROP = _DropTable("₹.,/-")
+
 def _clean_name(desc: str) -> str:
     if not desc: return ""
     
     # Remove common invoice noise
-    desc = re.sub(r"\s*\([^)]*\)|\s*\[[^\]]*\]", "", desc)
+    desc = _BRACKETS_RE.sub("", desc)
     
     # Remove specific patterns found in Sarom.pdf
-    noise = [
-        r"\b(GSTIN|GST|IGST|CGST|SGST|Tax|Total|Sub[- ]?total|Grand Total|Invoice|Bill|Address|Ship To|PIN|Pincode|Phone|Mobile|Email)\b",
-        r"[A-Z]{2}\d{2}[A-Z]{5}\d[A-Z]\d[A-Z]\d",  # GSTIN-like
-        r"\b\d{6}\b",
-        r"\b\d{1,2}\b",  # Single/double digit numbers (like line numbers)
-        r"\b5%\b",  # Tax percentages
-        r"\b[A-Z]{2}\d{2}[A-Z]{5}\d{2}\b",  # HSN codes like 55169200
-        r"\b[A-Z]{2}\d{2}[A-Z]{5}\d{2}\b",  # HSN codes like 55169200
-        r"\|\s*5%\s*\|",  # Tax percentage patterns
-        r"\|\s*5%:",  # Tax percentage patterns
-        r"\|\s*5%!",  # Tax percentage patterns
-        r"\|\s*5%\)",  # Tax percentage patterns
-        r"\|\s*5%i",  # Tax percentage patterns
-        r"§\d+",  # Section symbols with numbers
-        r"\$\d+",  # Dollar symbols with numbers
-        r"\"\d+",  # Quote symbols with numbers
-        r"~\d+",  # Tilde symbols with numbers
-        r"-\d+",  # Dash with numbers
-    ]
-    
-    for p in noise: 
-        desc = re.sub(p, "", desc, flags=re.I)
+    desc = _NOISE_RE.sub("", desc)
     
     # Clean up extra whitespace and normalize
-    desc = re.sub(r"\s+", " ", desc).strip()
+    desc = _WS_RE.sub(" ", desc).strip()
     
-    # Remove leading/trailing punctuation and symbols
-    desc = re.sub(r"^[:\-\s|]+|[:\-\s|]+$", "", desc)
+    # Remove leading/trailing punctuation and symbols (only ' ' is left as whitespace)
+    desc = desc.strip(": -|")
     
     # If description is too short or contains mostly numbers/symbols, return empty
-    if len(desc) < 3 or re.fullmatch(r"[₹\d\s\.,/-]+", desc): 
+    if len(desc) < 3 or not desc.translate(_NUMERIC_ONLY_DROP): 
         return ""
     
     return desc
@@ -143,6 +212,9 @@ def _token_set_ratio(a: str, b: str) -> float:
     return round(100 * j, 2)
 
 # ========== CSV Fabric Matching ==========
+_NON_WORD_RE = re.compile(r'[^\w\d]')
+
+@functools.lru_cache(maxsize=8192)
 def clean_fabric_name(name: str) -> str:
     """Clean fabric name by removing spaces, making lowercase, removing punctuation"""
     if not name:
@@ -155,10 +227,11 @@ def clean_fabric_name(name: str) -> str:
     name = name.replace(" ", "")
     
     # Remove common punctuation except numbers
-    name = re.sub(r'[^\w\d]', '', name)
+    name = _NON_WORD_RE.sub('', name)
     
     return name
 
+@functools.lru_cache(maxsize=8192)
 def remove_csv_prefix(name: str) -> str:
     """Remove common CSV prefixes like 'A - '"""
     # Remove "A - " prefix
@@ -166,26 +239,6 @@ def remove_csv_prefix(name: str) -> str:
         return name[4:]
     return name
 
-def calculate_similarity(str1: str, str2: str) -> float:
-    """Calculate string similarity using multiple methods"""
-    # SequenceMatcher similarity
-    seq_similarity = SequenceMatcher(None, str1, str2).ratio()
-    
-    # Character overlap similarity
-    char_overlap = len(set(str1) & set(str2)) / len(set(str1) | set(str2)) if str1 and str2 else 0
-    
-    # Word overlap similarity (if we can split)
-    word_similarity = 0
-    if ' ' in str1 and ' ' in str2:
-        words1 = set(str1.lower().split())
-        words2 = set(str2.lower().split())
-        if words1 and words2:
-            word_overlap = len(words1 & words2) / len(words1 | words2)
-            word_similarity = word_overlap
-    
-    # Weighted average
-    return (seq_similarity * 0.5 + char_overlap * 0.3 + word_similarity * 0.2)
-
 def find_csv_fabric_match(parsed_name: str, csv_fabrics: list, threshold: float = 0.5) -> Optional[dict]:
     """Find best CSV fabric match using multiple matching strategies"""
     if not csv_fabrics:
@@ -193,23 +246,29 @@ def find_csv_fabric_match(parsed_name: str, csv_fabrics: list, threshold: float
     
     # Clean parsed name
     parsed_cleaned = clean_fabric_name(parsed_name)
+    parsed_len = len(parsed_cleaned)
     
     best_match = None
     best_score = 0.0
     
-    for fabric in csv_fabrics:
-        csv_name = fabric['original_name']
-        csv_cleaned = fabric['cleaned_name']
-        
-        # Remove CSV prefix for comparison
-        csv_name_no_prefix = remove_csv_prefix(csv_name)
-        csv_cleaned_no_prefix = clean_fabric_name(csv_name_no_prefix)
+    # WRatio (best of the plain, partial and token-based ratios) against every
+    # candidate in a single C++ batch call; scores under the threshold come back as 0
+    sim_scores = process.cdist(
+        [parsed_cleaned], [f['cleaned_name_no_prefix'] for f in csv_fabrics],
+        scorer=fuzz.WRatio, processor=utils.default_process,
+        score_cutoff=threshold * 100, dtype=np.float64,
+    )[0].tolist()
+    
+    for fabric, sim_score in zip(csv_fabrics, sim_scores):
+        # Prefix-stripped fields are precomputed once in load_csv_fabrics
+        csv_name_no_prefix = fabric['csv_name_no_prefix']
+        csv_cleaned_no_prefix = fabric['cleaned_name_no_prefix']
         
         # Strategy 1: Direct substring matching (after removing CSV prefix)
         if parsed_cleaned in csv_cleaned_no_prefix:
             # Boost score for short fabric names that are found as substrings
-            base_score = len(parsed_cleaned) / len(csv_cleaned_no_prefix) * 100
-            if len(parsed_cleaned) <= 10:
+            base_score = parsed_len / fabric['cleaned_name_no_prefix_len'] * 100
+            if parsed_len <= 10:
                 # For short names like "NEW ROYAL", boost the score significantly
                 match_score = min(95.0, base_score + 60.0)
             else:
@@ -227,7 +286,7 @@ def find_csv_fabric_match(parsed_name: str, csv_fabrics: list, threshold: float
         
         # Strategy 2: CSV name (without prefix) is substring of parsed name
         elif csv_cleaned_no_prefix in parsed_cleaned:
-            match_score = len(csv_cleaned_no_prefix) / len(parsed_cleaned) * 100
+            match_score = fabric['cleaned_name_no_prefix_len'] / parsed_len * 100
             if match_score > best_score:
                 best_score = match_score
                 best_match = {
@@ -239,7 +298,7 @@ def find_csv_fabric_match(parsed_name: str, csv_fabrics: list, threshold: float
                 }
         
         # Strategy 3: Fuzzy matching with similarity threshold
-        similarity = calculate_similarity(parsed_cleaned, csv_cleaned_no_prefix)
+        similarity = sim_score / 100.0
         if similarity >= threshold:
             fuzzy_score = similarity * 100
             if fuzzy_score > best_score:
@@ -253,7 +312,7 @@ def find_csv_fabric_match(parsed_name: str, csv_fabrics: list, threshold: float
                 }
     
     # For short fabric names (like "NEW ROYAL"), lower the threshold
-    min_threshold = 30.0 if len(parsed_cleaned) <= 10 else 50.0
+    min_threshold = 30.0 if parsed_len <= 10 else 50.0
     return best_match if best_score >= min_threshold else None
 
 def load_csv_fabrics() -> list:
@@ -266,19 +325,31 @@ def load_csv_fabrics() -> list:
         return fabrics_data
     
     try:
-        with open(csv_file, 'r', encoding='utf-8', errors='ignore') as f:
-            reader = csv.DictReader(f)
+        with open(csv_file, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+            # Plain csv.reader + header positions: no per-row dict, and only the
+            # four columns we use are touched (non-fabric rows skip the rest)
+            reader = csv.reader(f)
+            col = {name: idx for idx, name in enumerate(next(reader, []))}
+            name_i, cat_i = col.get('Material_name'), col.get('Category')
+            price_i, supplier_i = col.get('Default_purchase_price'), col.get('Default supplier')
+            cell = lambda row, idx: row[idx].strip() if idx is not None and idx < len(row) else ''
             for row in reader:
-                material_name = row.get('Material_name', '').strip()
-                category = row.get('Category', '').strip()
-                default_price = row.get('Default_purchase_price', '').strip()
-                supplier = row.get('Default supplier', '').strip()
-                
-                if material_name and category == 'Fabric':
+                if cell(row, cat_i) != 'Fabric':
+                    continue
+                material_name = cell(row, name_i)
+                if material_name:
+                    default_price = cell(row, price_i)
+                    supplier = cell(row, supplier_i)
                     cleaned_name = clean_fabric_name(material_name)
+                    # Precompute the prefix-stripped forms used by find_csv_fabric_match
+                    name_no_prefix = remove_csv_prefix(material_name)
+                    cleaned_no_prefix = clean_fabric_name(name_no_prefix)
                     fabrics_data.append({
                         'original_name': material_name,
                         'cleaned_name': cleaned_name,
+                        'csv_name_no_prefix': name_no_prefix,
+                        'cleaned_name_no_prefix': cleaned_no_prefix,
+                        'cleaned_name_no_prefix_len': len(cleaned_no_prefix),
                         'default_price': default_price,
                         'supplier': supplier
                     })
@@ -324,27 +395,130 @@ def load_db_items() -> List[DBItem]:
                 items.append(DBItem(nm, _num(row.get("default_purchase_price"))))
     return items
 
-def build_db_index(db_items: List[DBItem]) -> Dict[str, DBItem]:
-    return {_norm(x.material_name): x for x in db_items}
+@dataclass
+class DBIndex:
+    by_key: Dict[str, DBItem]           # _norm(material_name) -> item
+    keys: List[str]                     # stripped keys, in index order
+    items: List[DBItem]                 # items aligned with keys
+    token_index: Dict[str, Set[int]]    # token -> positions in keys
+    token_counts: List[int]             # number of distinct tokens, aligned with keys
+    key_positions: Dict[str, List[int]] # key -> its positions (for "key in query")
+    key_lengths: List[int]              # distinct key lengths, ascending
+    gram_index: Dict[str, Set[int]]     # every 1..3-char substring -> positions (for "query in key")
+
+# Longest substring indexed in DBIndex.gram_index
+_GRAM_N = 3
+
+def build_db_index(db_items: List[DBItem]) -> DBIndex:
+    by_key = {_norm(x.material_name): x for x in db_items}
+    keys = [k.strip() for k in by_key]
+    token_index: Dict[str, Set[int]] = defaultdict(set)
+    key_positions: Dict[str, List[int]] = defaultdict(list)
+    gram_index: Dict[str, Set[int]] = defaultdict(set)
+    for pos, k in enumerate(keys):
+        for t in k.split():
+            token_index[t].add(pos)
+        if not k: continue
+        key_positions[k].append(pos)
+        for n in range(1, _GRAM_N + 1):
+            for i in range(len(k) - n + 1):
+                gram_index[k[i:i + n]].add(pos)
+    return DBIndex(by_key, keys, list(by_key.values()), token_index, [len(set(k.split())) for k in keys],
+                   key_positions, sorted({len(k) for k in key_positions}), gram_index)
+
+def _substring_related(qkey: str, db_index: DBIndex) -> Set[int]:
+    """Positions of the non-empty keys k with qkey in k or k in qkey, found from
+    index postings only (no pass over every key)"""
+    n = len(qkey)
+    related: Set[int] = set()
+    # k in qkey: look up each substring of qkey whose length some key has
+    for ln in db_index.key_lengths:
+        if ln > n: break
+        for i in range(n - ln + 1):
+            related.update(db_index.key_positions.get(qkey[i:i + ln], ()))
+    # qkey in k: k holds every gram of qkey; short queries are grams themselves
+    if n <= _GRAM_N:
+        related |= db_index.gram_index.get(qkey, set())
+    else:
+        postings = sorted((db_index.gram_index.get(qkey[i:i + _GRAM_N], set())
+                           for i in range(n - _GRAM_N + 1)), key=len)
+        related.update(pos for pos in postings[0].intersection(*postings[1:])
+                       if qkey in db_index.keys[pos])
+    return related
 
-def best_match(name: str, db_index: Dict[str, DBItem]) -> Tuple[Optional[DBItem], float]:
+def best_match(name: str, db_index: DBIndex) -> Tuple[Optional[DBItem], float]:
     key = _norm(name)
-    if key in db_index: return db_index[key], 100.0
+    if key in db_index.by_key: return db_index.by_key[key], 100.0
+    qkey = key.strip()
+    if not qkey: return None, 0.0
+    # Only keys sharing a token or related by substring can score above 0. Counting
+    # the postings each key appears in gives its shared-token count, so every
+    # candidate gets its exact _token_set_ratio(key, k) without a set per key
+    qtokens = set(qkey.split())
+    shared: Counter = Counter()
+    for t in qtokens:
+        shared.update(db_index.token_index.get(t, ()))
+    related = _substring_related(qkey, db_index)
     best, scbest = None, 0.0
-    for k, it in db_index.items():
-        sc = _token_set_ratio(key, k)
-        if sc > scbest: scbest, best = sc, it
+    for pos in sorted(shared.keys() | related):  # index order: the earliest key wins ties
+        inter = shared.get(pos, 0)
+        j = inter / (len(qtokens) + db_index.token_counts[pos] - inter)
+        if pos in related: j = max(j, 0.85)
+        sc = round(100 * j, 2)
+        if sc > scbest: scbest, best = sc, db_index.items[pos]
     return (best, scbest) if scbest >= 80.0 else (None, scbest)
 
 
 # ========== OCR ==========
-def _extract_text_from_pdf(path: str) -> str:
-    """Try pdfplumber first for better table structure, fall back to fitz+OCR for scanned PDFs"""
+_TESS_API = None  # one libtesseract instance per process, created on first use
+_TESS_LOCK = threading.Lock()
+
+# LSTM engine only, pages read as one uniform text block (invoice tables), and no
+# inverted-image pass or dictionary loading; best paired with tessdata_fast models
+_TESS_OEM, _TESS_PSM = 1, 6
+_TESS_VARS = {"tessedit_do_invert": "0", "load_system_dawg": "0", "load_freq_dawg": "0"}
+_TESS_CONFIG = f"--oem {_TESS_OEM} --psm {_TESS_PSM} " + " ".join(f"-c {k}={v}" for k, v in _TESS_VARS.items())
+
+def _ocr_image(img: np.ndarray) -> str:
+    """OCR a preprocessed image with tesserocr when installed, else pytesseract"""
+    global _TESS_API
+    if PyTessBaseAPI is None:
+        return pytesseract.image_to_string(img, lang="eng", config=_TESS_CONFIG)
+    with _TESS_LOCK:
+        if _TESS_API is None:
+            _TESS_API = PyTessBaseAPI(lang="eng", oem=_TESS_OEM, psm=_TESS_PSM, variables=_TESS_VARS)
+        _TESS_API.SetImage(Image.fromarray(img))
+        return _TESS_API.GetUTF8Text()
+
+def _init_ocr_worker():
+    # Spawned workers import this module afresh, so _TESS_API starts as None and
+    # each builds its own engine on first use. Tesseract's OpenMP threading is
+    # slower than one single-threaded process per page
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    _wire_tesseract()
+
+def _ocr_page(path: str, page_idx: int) -> str:
+    """Render one PDF page at 300 dpi and OCR it (top-level so a process pool can pickle it)"""
+    with fitz.open(path) as doc:
+        # Render straight to 8-bit grayscale and view the samples as an array
+        # (no RGB → PIL → NumPy → GRAY copies); pix stays alive until we return
+        pix = doc.load_page(page_idx).get_pixmap(dpi=300, colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width)
+    den = cv2.medianBlur(gray, 3)
+    thr = cv2.adaptiveThreshold(den, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                cv2.THRESH_BINARY, 31, 5)
+    return _ocr_image(thr).strip()
+
+def _extract_text_from_pdf(path: str, data: Optional[bytes] = None) -> str:
+    """Try pdfplumber first for better table structure, fall back to fitz+OCR for scanned PDFs.
+    Both readers parse the same in-memory bytes (data, else read once from path)."""
+    if data is None:
+        data = Path(path).read_bytes()
     try:
         # Try pdfplumber first for better table structure preservation
         import pdfplumber
         txt_pages = []
-        with pdfplumber.open(path) as pdf:
+        with pdfplumber.open(io.BytesIO(data)) as pdf:
             for p in pdf.pages:
                 # Use tolerance settings for better table extraction
                 txt_pages.append(p.extract_text(x_tolerance=2, y_tolerance=3) or "")
@@ -360,26 +534,32 @@ def _extract_text_from_pdf(path: str) -> str:
         # Fall back to fitz + OCR for scanned PDFs
         try:
             print("   📄 Using PyMuPDF + OCR for scanned PDF...")
-            doc = fitz.open(path)
+            with fitz.open(stream=data, filetype="pdf") as doc:
+                page_texts = [doc.load_page(i).get_text().strip() for i in range(len(doc))]
+            
+            # Pages without a usable text layer get OCR'd; several of them run in parallel
+            ocr_pages = [i for i, t in enumerate(page_texts) if not (t and len(t) > 20)]
+            workers = min(len(ocr_pages), os.cpu_count() or 1)
+            if workers > 1:
+                # spawn, not fork: callers may have other threads running (Flask handlers,
+                # test_cost_matching's background DB load) and forking a threaded process
+                # can deadlock the children on locks held mid-operation. Each spawned
+                # worker starts an interpreter and re-imports cv2/fitz/rapidfuzz (~0.3-0.4 s),
+                # less than one 300-dpi page OCR, so it only pays with 2+ pages and 2+ cores
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker,
+                                         mp_context=multiprocessing.get_context("spawn")) as ex:
+                    ocr_texts = list(ex.map(_ocr_page, [path] * len(ocr_pages), ocr_pages))
+            else:
+                ocr_texts = [_ocr_page(path, i) for i in ocr_pages]
+            
             parts = []
-            for i in range(len(doc)):
-                page = doc.load_page(i)
-                t = page.get_text().strip()
-                if t and len(t) > 20:
+            ocr_by_page = dict(zip(ocr_pages, ocr_texts))
+            for i, t in enumerate(page_texts):
+                if i not in ocr_by_page:
                     parts.append(t)
-                else:
-                    # Convert page to image and use OCR
-                    pix = page.get_pixmap(dpi=300, alpha=False)
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    gray = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2GRAY)
-                    den = cv2.medianBlur(gray, 3)
-                    thr = cv2.adaptiveThreshold(den, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                                cv2.THRESH_BINARY, 31, 5)
-                    ocr = pytesseract.image_to_string(thr, lang="eng")
-                    if ocr.strip(): 
-                        parts.append(ocr.strip())
-                        print(f"      📄 Page {i+1}: OCR extracted {len(ocr.strip())} characters")
-            doc.close()
+                elif ocr_by_page[i]:
+                    parts.append(ocr_by_page[i])
+                    print(f"      📄 Page {i+1}: OCR extracted {len(ocr_by_page[i])} characters")
             return "\n".join(parts).strip()
         except Exception as e:
             print(f"PDF extract error: {e}")
@@ -393,16 +573,53 @@ def _extract_text_from_image(path: str) -> str:
         den = cv2.medianBlur(gray, 3)
         thr = cv2.adaptiveThreshold(den, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                     cv2.THRESH_BINARY, 31, 5)
-        return pytesseract.image_to_string(thr, lang="eng").strip()
+        return _ocr_image(thr).strip()
     except Exception as e:
         print(f"Image OCR error: {e}")
         return ""
 
+# Bump when rendering/preprocessing/OCR settings change to invalidate old entries
+_OCR_CACHE_VERSION = "dpi300_eng_oem1_psm6_v2"
+
+def _ocr_cache_path(data: bytes) -> Path:
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return Path(os.getenv("OCR_CACHE_DIR", ".ocr_cache")) / f"{digest}_{_OCR_CACHE_VERSION}.txt"
+
+def _write_ocr_cache(cache_file: Path, text: str):
+    # Write to a temp file and rename so a crash never leaves a partial entry
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        print(f"⚠️ OCR cache write failed: {e}")
+
 def extract_text(path: str) -> str:
     ext = Path(path).suffix.lower()
-    if ext == ".pdf": return _extract_text_from_pdf(path)
-    if ext in [".png",".jpg",".jpeg",".tif",".tiff",".bmp",".webp"]: return _extract_text_from_image(path)
-    raise ValueError(f"Unsupported file type: {ext}")
+    if ext != ".pdf" and ext not in [".png",".jpg",".jpeg",".tif",".tiff",".bmp",".webp"]:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+    # Same file content → same text; skip OCR entirely on a cache hit.
+    # The bytes read for the hash are reused by the PDF readers.
+    data = Path(path).read_bytes()
+    cache_file = _ocr_cache_path(data)
+    if cache_file.exists():
+        return cache_file.read_text(encoding="utf-8")
+
+    text = _extract_text_from_pdf(path, data) if ext == ".pdf" else _extract_text_from_image(path)
+    if text: _write_ocr_cache(cache_file, text)
+    return text
+
+
+_IGST_TOKEN_RE   = re.compile(r'\b[iI1l]\s*G\s*S\s*T\b', re.IGNORECASE)  # tolerant of OCR spacing
+_IGST_COMPACT_RE = re.compile(r'[iI1l]GST', re.I)
+_IGST_PCT_RE     = re.compile(r'(\d{1,2}(?:\.\d{1,2})?)\s*%')            # 5 or 5.00%
+_IGST_AMT_RE     = re.compile(r'₹?\s*([\d,]+(?:\.\d{1,2})?)')             # ₹1,234.56 or 1234.56
+
+# Signed amounts: ₹1,234.56 | 1234.56 | +0.48 | -0.48
+_AMT_RE = re.compile(r'₹?\s*([+-]?\d[\d,]*(?:\.\d+)?)')
 
 
 def extract_igst_lines(text: str) -> List[TaxLine]:
@@ -418,52 +635,7 @@ def extract_igst_lines(text: str) -> List[TaxLine]:
       - Grab first percentage in the line as rate.
       - Grab last currency-like number after the token as amount (fallback to neighbor lines).
     """
-    igst_token = re.compile(r'\b[iI1l]\s*G\s*S\s*T\b', re.IGNORECASE)  # tolerant of OCR spacing
-    pct_re     = re.compile(r'(\d{1,2}(?:\.\d{1,2})?)\s*%')            # 5 or 5.00%
-    amt_re     = re.compile(r'₹?\s*([\d,]+(?:\.\d{1,2})?)')             # ₹1,234.56 or 1234.56
-
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    out: List[TaxLine] = []
-
-    for i, line in enumerate(lines):
-        if not igst_token.search(line):
-            # small heuristic: sometimes "I GST" is spaced weirdly; compress spaces then retry
-            compact = re.sub(r'\s+', '', line, flags=re.I)
-            if not re.search(r'[iI1l]GST', compact, re.I):
-                continue
-
-        # Try to read rate
-        rate = None
-        m_rate = pct_re.search(line)
-        if m_rate:
-            try:
-                rate = float(m_rate.group(1))
-            except Exception:
-                rate = None
-
-        # Try to read amount (prefer numbers AFTER the IGST token)
-        amount = None
-        tok = igst_token.search(line)
-        post = line[tok.end():] if tok else line
-        nums = amt_re.findall(post)
-        if nums:
-            try:
-                amount = float(nums[-1].replace(',', ''))
-            except Exception:
-                amount = None
-        else:
-            # Fallback: check the next line (tables often wrap)
-            if i + 1 < len(lines):
-                nxt_nums = amt_re.findall(lines[i + 1])
-                if nxt_nums:
-                    try:
-                        amount = float(nxt_nums[-1].replace(',', ''))
-                    except Exception:
-                        amount = None
-
-        out.append(TaxLine(tax="IGST", rate_pct=rate, amount=amount, line_text=line))
-
-    return out
+    return list(scan_invoice(text)["igst_lines"])
 
 
 def pick_invoice_igst(igst_lines: List[TaxLine]) -> Optional[TaxLine]:
@@ -480,6 +652,19 @@ def pick_invoice_igst(igst_lines: List[TaxLine]) -> Optional[TaxLine]:
     return igst_lines[-1]
 
 
+# GST Rate matcher: 5%, 18%, 12% etc.
+_GST_RATE_RE = re.compile(r'\b(\d{1,2}(?:\.\d{1,2})?)\s*%\s*(?:GST|Tax|Rate)?\b', re.I)
+
+_CGST_PATTERNS = (
+    re.compile(r'\bC\.?\s*G\.?\s*S\.?\s*T\.?\s*(?:SALES|OUTPUT)?\b', re.I),
+    re.compile(r'\bC\s*G\s*S\s*T\s*(?:SALES|OUTPUT)?\b', re.I),
+)
+_SGST_PATTERNS = (
+    re.compile(r'\bS\.?\s*G\.?\s*S\.?\s*T\.?\s*(?:SALES|OUTPUT)?\b', re.I),
+    re.compile(r'\bS\s*G\s*S\s*T\s*(?:SALES|OUTPUT)?\b', re.I),
+)
+
+
 def extract_cgst_sgst_roundoff(text: str) -> TaxSummary:
     """
     Pull CGST SALES, SGST SALES, and Rounded Off from Sarom-style invoices.
@@ -487,65 +672,15 @@ def extract_cgst_sgst_roundoff(text: str) -> TaxSummary:
     Tolerant of OCR variants: 'C G S T', 'C.G.S.T', 'Round off', 'Rounded Off', 'R/O', etc.
     If amount is not on the same line, looks at the next 1–2 lines.
     """
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    return scan_invoice(text)["tax_summary"]
 
-    # Amount matcher: ₹1,234.56 | 1234.56 | +0.48 | -0.48
-    amt_re = re.compile(r'₹?\s*([+-]?\d[\d,]*(?:\.\d+)?)')
-    
-    # GST Rate matcher: 5%, 18%, 12% etc.
-    gst_rate_re = re.compile(r'\b(\d{1,2}(?:\.\d{1,2})?)\s*%\s*(?:GST|Tax|Rate)?\b', re.I)
-
-    def _grab_amount_from(i: int, start_col: int = 0) -> Optional[float]:
-        # Try same line, after the matched label
-        mlist = amt_re.findall(lines[i][start_col:])
-        if mlist:
-            return _num(mlist[-1])
-        # Fallback: numbers on the next 1–2 lines (tables often wrap)
-        for j in (1, 2):
-            if i + j >= len(lines): break
-            mlist = amt_re.findall(lines[i + j])
-            if mlist:
-                return _num(mlist[-1])
-        return None
-
-    def _find_amount_by_labels(patterns: List[re.Pattern]) -> Optional[float]:
-        for i, ln in enumerate(lines):
-            for pat in patterns:
-                m = pat.search(ln)
-                if m:
-                    val = _grab_amount_from(i, m.end())
-                    if val is not None:
-                        return val
-        return None
-    
-    def _find_gst_rate() -> Optional[float]:
-        """Find GST rate percentage in the invoice text"""
-        for ln in lines:
-            m = gst_rate_re.search(ln)
-            if m:
-                try:
-                    rate = float(m.group(1))
-                    # Common GST rates in India: 5%, 12%, 18%, 28%
-                    if rate in [5, 12, 18, 28] or (rate > 0 and rate <= 30):
-                        return rate
-                except ValueError:
-                    continue
-        return None
 
-    cgst_patterns = [
-        re.compile(r'\bC\.?\s*G\.?\s*S\.?\s*T\.?\s*(?:SALES|OUTPUT)?\b', re.I),
-        re.compile(r'\bC\s*G\s*S\s*T\s*(?:SALES|OUTPUT)?\b', re.I),
-    ]
-    sgst_patterns = [
-        re.compile(r'\bS\.?\s*G\.?\s*S\.?\s*T\.?\s*(?:SALES|OUTPUT)?\b', re.I),
-        re.compile(r'\bS\s*G\s*S\s*T\s*(?:SALES|OUTPUT)?\b', re.I),
-    ]
-
-    return TaxSummary(
-        gst_rate=_find_gst_rate(),
-        cgst=_find_amount_by_labels(cgst_patterns),
-        sgst=_find_amount_by_labels(sgst_patterns),
-    )
+# tolerant IGST token and "Output ..." label
+_OUT_IGST_RE = re.compile(
+    r'\bOutput\s*[iI1l]\s*G\s*S\s*T\b(?:\s*[-–—]\s*[A-Za-z .]+)?',  # e.g., Output IGST-Delhi
+    re.IGNORECASE,
+)
+_OUT_IGST_COMPACT_RE = re.compile(r'Output[iI1l]GST(?:[-–—][A-Za-z.]+)?', re.I)
 
 
 def extract_output_igst_total(text: str) -> Optional[OutputIGST]:
@@ -554,53 +689,55 @@ def extract_output_igst_total(text: str) -> Optional[OutputIGST]:
     Robust to OCR: 'Output I GST', 'Output lGST', 'Output 1GST', hyphen/emdash, city suffix optional.
     If the amount isn't on the same line, checks the next 1–2 lines (common in table exports).
     """
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-
-    # tolerant IGST token and "Output ..." label
-    out_igst_pat = re.compile(
-        r'\bOutput\s*[iI1l]\s*G\s*S\s*T\b(?:\s*[-–—]\s*[A-Za-z .]+)?',  # e.g., Output IGST-Delhi
-        re.IGNORECASE,
-    )
-    amt_re = re.compile(r'₹?\s*([+-]?\d[\d,]*(?:\.\d+)?)')  # grabs right-aligned numbers like 347.51
-
-    def grab_amount(i: int, start_col: int) -> Optional[float]:
-        # Prefer numbers to the RIGHT of the matched label on the same line
-        same_line_nums = amt_re.findall(lines[i][start_col:])
-        if same_line_nums:
-            return _num(same_line_nums[-1])
-        # Fallback: next 1–2 lines (table wrapping)
-        for j in (1, 2):
-            if i + j >= len(lines): break
-            nxt_nums = amt_re.findall(lines[i + j])
-            if nxt_nums:
-                return _num(nxt_nums[-1])
-        # Rare fallback: previous line may hold the amount
-        for j in (1, 2):
-            if i - j < 0: break
-            prv_nums = amt_re.findall(lines[i - j])
-            if prv_nums:
-                return _num(prv_nums[-1])
-        return None
-
-    hits: List[OutputIGST] = []
-    for i, ln in enumerate(lines):
-        m = out_igst_pat.search(ln)
-        if not m:
-            # Sometimes OCR collapses spaces; try compacted line
-            compact = re.sub(r'\s+', '', ln)
-            m = re.search(r'Output[iI1l]GST(?:[-–—][A-Za-z.]+)?', compact, re.I)
-            if not m:
-                continue
-        amt = grab_amount(i, m.end())
-        label = ln[m.start():m.end()]
-        hits.append(OutputIGST(label=label, amount=amt, line_text=ln))
-
-    if not hits:
-        return None
-
-    # If multiple matches (rare), choose the one with the largest amount
-    with_amount = [h for h in hits if h.amount is not None]
-    return max(with_amount, key=lambda h: h.amount or 0) if with_amount else hits[-1]
+    return scan_invoice(text)["output_igst"]
+
+
+# Totals-panel labels for Home Ideas / D'Decor invoices
+_HOME_IDEAS_PATS = {
+    "sub_total": (
+        re.compile(r'\bSub\s*Total\b', re.I),
+        re.compile(r'\bSubtotal\b', re.I),
+    ),
+    "courier_charges": (
+        re.compile(r'\bCourier\s*Charges?\b', re.I),
+    ),
+    "add_charges": (
+        re.compile(r'\bAdd/?\s*Charges?\b', re.I),
+        re.compile(r'\bAdd\.?\s*Charges?\b', re.I),
+        re.compile(r'\bAdditional\s*Charges?\b', re.I),
+    ),
+    "taxable_value": (
+        re.compile(r'\bTaxable\s*Value\b', re.I),
+    ),
+    "tcs_amount": (
+        re.compile(r'\bTCS\s*Amount\b', re.I),
+        re.compile(r'\bTCS\b', re.I),
+    ),
+    "igst_amount": (
+        re.compile(r'\bIGST\s*Amount\b', re.I),
+    ),
+    "cgst_amount": (
+        re.compile(r'\bCGST\s*Amount\b', re.I),
+    ),
+    "sgst_amount": (
+        re.compile(r'\bSGST\s*Amount\b', re.I),
+    ),
+    "total_inc_taxes": (
+        re.compile(r'\bTOTAL\s*INC\.?\s*OF\s*TAXES\b', re.I),
+        re.compile(r'\bTotal\s*Incl?\.?\s*of\s*Taxes\b', re.I),
+        re.compile(r'\bGrand\s*Total\b', re.I),  # occasional variant
+    ),
+}
+
+# All totals labels as one alternation, a named group per field, so the whole
+# invoice is scanned once; \s is kept from crossing into the next line
+_HOME_IDEAS_RE = re.compile(
+    "|".join(
+        "(?P<%s>%s)" % (field, "|".join(p.pattern.replace(r"\s", r"[^\S\n]") for p in pats))
+        for field, pats in _HOME_IDEAS_PATS.items()
+    ),
+    re.I,
+)
 
 
 def extract_homeideas_totals(text: str) -> HomeIdeasTotals:
@@ -615,74 +752,178 @@ def extract_homeideas_totals(text: str) -> HomeIdeasTotals:
       - Find a label by regex (OCR tolerant).
       - Take the right-most numeric on the same line; else look on the next 1–2 lines.
     """
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-
-    # Matches ₹1,234.56, 1234.56, +0.48, -0.48, etc.
-    amt_re = re.compile(r'₹?\s*([+-]?\d[\d,]*(?:\.\d+)?)')
-
-    def rightmost_amount_after(i: int, start_col: int = 0) -> Optional[float]:
-        # Prefer numbers to the right of the label on the same line
-        nums = amt_re.findall(lines[i][start_col:])
-        if nums:
-            return _num(nums[-1])
-
-        # Fallback: amounts may wrap to next lines in OCR/text extraction
-        for off in (1, 2):
-            if i + off < len(lines):
-                nums = amt_re.findall(lines[i + off])
-                if nums:
-                    return _num(nums[-1])
-        return None
+    return scan_invoice(text)["homeideas_totals"]
+
+
+def _amounts_by_line(joined: str, line_starts: List[int]) -> List[List[Tuple[int, str]]]:
+    """(column, raw amount) of every _AMT_RE match, grouped by line, from a
+    single finditer over the joined lines instead of a findall per lookup."""
+    by_line: List[List[Tuple[int, str]]] = [[] for _ in line_starts[:-1]]
+    for m in _AMT_RE.finditer(joined):
+        li = bisect_right(line_starts, m.start(1)) - 1
+        by_line[li].append((m.start(1) - line_starts[li], m.group(1)))
+    return by_line
+
+def _last_amount_from(lines: List[str], amounts: List[List[Tuple[int, str]]], i: int, start_col: int) -> Optional[str]:
+    for col, raw in reversed(amounts[i]):
+        if col >= start_col:
+            return raw
+        if col + len(raw) > start_col:
+            # Label ends inside a number (compacted-line match); rescan the tail
+            nums = _AMT_RE.findall(lines[i][start_col:])
+            return nums[-1] if nums else None
+        break
+    return None
+
+def _amount_near(lines: List[str], amounts: List[List[Tuple[int, str]]], i: int,
+                 start_col: int = 0, look_back: bool = False) -> Optional[float]:
+    """Right-most amount after start_col on line i, else on the next 1–2 lines
+    (tables wrap), else (look_back) on the previous 1–2 lines."""
+    raw = _last_amount_from(lines, amounts, i, start_col)
+    if raw is not None:
+        return _num(raw)
+    for j in (1, 2):
+        if i + j >= len(lines): break
+        if amounts[i + j]:
+            return _num(amounts[i + j][-1][1])
+    if look_back:
+        for j in (1, 2):
+            if i - j < 0: break
+            if amounts[i - j]:
+                return _num(amounts[i - j][-1][1])
+    return None
+
+def _label_amount(lines: List[str], amounts, i: int, patterns) -> Optional[float]:
+    """Amount for the first label pattern on line i that yields one"""
+    for pat in patterns:
+        m = pat.search(lines[i])
+        if m:
+            val = _amount_near(lines, amounts, i, m.end())
+            if val is not None:
+                return val
+    return None
+
+def _igst_line(lines: List[str], i: int) -> Optional[TaxLine]:
+    line = lines[i]
+    if not _IGST_TOKEN_RE.search(line):
+        # small heuristic: sometimes "I GST" is spaced weirdly; compress spaces then retry
+        if not _IGST_COMPACT_RE.search(_WS_RE.sub('', line)):
+            return None
+
+    # Try to read rate
+    rate = None
+    m_rate = _IGST_PCT_RE.search(line)
+    if m_rate:
+        try:
+            rate = float(m_rate.group(1))
+        except Exception:
+            rate = None
+
+    # Try to read amount (prefer numbers AFTER the IGST token)
+    amount = None
+    tok = _IGST_TOKEN_RE.search(line)
+    post = line[tok.end():] if tok else line
+    nums = _IGST_AMT_RE.findall(post)
+    if not nums and i + 1 < len(lines):
+        # Fallback: check the next line (tables often wrap)
+        nums = _IGST_AMT_RE.findall(lines[i + 1])
+    if nums:
+        try:
+            amount = float(nums[-1].replace(',', ''))
+        except Exception:
+            amount = None
+
+    return TaxLine(tax="IGST", rate_pct=rate, amount=amount, line_text=line)
+
+def _gst_rate_in(line: str) -> Optional[float]:
+    m = _GST_RATE_RE.search(line)
+    if m:
+        rate = float(m.group(1))
+        # Common GST rates in India: 5%, 12%, 18%, 28%
+        if rate in [5, 12, 18, 28] or (rate > 0 and rate <= 30):
+            return rate
+    return None
+
+def _output_igst_hit(lines: List[str], amounts, i: int) -> Optional[OutputIGST]:
+    ln = lines[i]
+    m = _OUT_IGST_RE.search(ln)
+    if not m:
+        # Sometimes OCR collapses spaces; try compacted line
+        m = _OUT_IGST_COMPACT_RE.search(_WS_RE.sub('', ln))
+        if not m:
+            return None
+    # Rare fallback: previous line may hold the amount
+    amt = _amount_near(lines, amounts, i, m.end(), look_back=True)
+    return OutputIGST(label=ln[m.start():m.end()], amount=amt, line_text=ln)
 
-    def amount_for(patterns: List[re.Pattern]) -> Optional[float]:
-        for i, ln in enumerate(lines):
-            for p in patterns:
-                m = p.search(ln)
-                if m:
-                    # Right-most number on/after the label
-                    val = rightmost_amount_after(i, m.end())
-                    if val is not None:
-                        return val
-        return None
+@functools.lru_cache(maxsize=4)
+def scan_invoice(text: str) -> Dict[str, object]:
+    """
+    One pass over the invoice lines feeding every tax/totals extractor.
+    Each line only reaches the regexes its cheap substring gates allow;
+    the Home Ideas totals labels are found by a single alternation.
+    Returns {"igst_lines", "output_igst", "tax_summary", "homeideas_totals"};
+    cached per text so the extract_* wrappers share a single scan (the
+    result dataclasses are frozen and igst_lines is copied on the way out,
+    so no caller can alter the cached entry).
+    """
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    joined = "\n".join(lines)
+    line_starts = [0]
+    for ln in lines:
+        line_starts.append(line_starts[-1] + len(ln) + 1)
+    amounts = _amounts_by_line(joined, line_starts)
+
+    igst_lines: List[TaxLine] = []
+    out_hits: List[OutputIGST] = []
+    gst_rate = cgst = sgst = None
+    has_sales = False
+    totals: Dict[str, Optional[float]] = dict.fromkeys(_HOME_IDEAS_PATS)
 
-    pats = {
-        "sub_total": [
-            re.compile(r'\bSub\s*Total\b', re.I),
-            re.compile(r'\bSubtotal\b', re.I),
-        ],
-        "courier_charges": [
-            re.compile(r'\bCourier\s*Charges?\b', re.I),
-        ],
-        "add_charges": [
-            re.compile(r'\bAdd/?\s*Charges?\b', re.I),
-            re.compile(r'\bAdd\.?\s*Charges?\b', re.I),
-            re.compile(r'\bAdditional\s*Charges?\b', re.I),
-        ],
-        "taxable_value": [
-            re.compile(r'\bTaxable\s*Value\b', re.I),
-        ],
-        "tcs_amount": [
-            re.compile(r'\bTCS\s*Amount\b', re.I),
-            re.compile(r'\bTCS\b', re.I),
-        ],
-        "igst_amount": [
-            re.compile(r'\bIGST\s*Amount\b', re.I),
-        ],
-        "cgst_amount": [
-            re.compile(r'\bCGST\s*Amount\b', re.I),
-        ],
-        "sgst_amount": [
-            re.compile(r'\bSGST\s*Amount\b', re.I),
-        ],
-        "total_inc_taxes": [
-            re.compile(r'\bTOTAL\s*INC\.?\s*OF\s*TAXES\b', re.I),
-            re.compile(r'\bTotal\s*Incl?\.?\s*of\s*Taxes\b', re.I),
-            re.compile(r'\bGrand\s*Total\b', re.I),  # occasional variant
-        ],
+    for i, ln in enumerate(lines):
+        lower = ln.lower()
+        # Without dots/whitespace, so "I G S T" / "C. G. S. T." / "Out put" still gate
+        squashed = "".join(lower.replace('.', '').split())
+        has_sales = has_sales or 'sales' in lower
+
+        if 'gst' in squashed:
+            tax_line = _igst_line(lines, i)
+            if tax_line: igst_lines.append(tax_line)
+            if cgst is None and 'cgst' in squashed:
+                cgst = _label_amount(lines, amounts, i, _CGST_PATTERNS)
+            if sgst is None and 'sgst' in squashed:
+                sgst = _label_amount(lines, amounts, i, _SGST_PATTERNS)
+        if gst_rate is None and '%' in ln:
+            gst_rate = _gst_rate_in(ln)
+        if 'output' in squashed:
+            hit = _output_igst_hit(lines, amounts, i)
+            if hit: out_hits.append(hit)
+
+    # Home Ideas totals: one pass of the label alternation; per field, the first
+    # label in reading order that has an amount wins
+    for m in _HOME_IDEAS_RE.finditer(joined):
+        field = m.lastgroup
+        if totals[field] is None:
+            li = bisect_right(line_starts, m.start()) - 1
+            totals[field] = _amount_near(lines, amounts, li, m.end() - line_starts[li])
+
+    # If multiple Output IGST matches (rare), choose the one with the largest amount
+    output_igst = None
+    if out_hits:
+        with_amount = [h for h in out_hits if h.amount is not None]
+        output_igst = max(with_amount, key=lambda h: h.amount or 0) if with_amount else out_hits[-1]
+
+    # Label CGST/SGST as "... SALES" when "SALES" is mentioned in the invoice
+    sales = " SALES" if has_sales else ""
+
+    return {
+        "igst_lines": igst_lines,
+        "output_igst": output_igst,
+        "tax_summary": TaxSummary(gst_rate=gst_rate, cgst=cgst, sgst=sgst,
+                                  cgst_label="CGST" + sales, sgst_label="SGST" + sales),
+        "homeideas_totals": HomeIdeasTotals(**totals),
     }
 
-    values = {k: amount_for(v) for k, v in pats.items()}
-    return HomeIdeasTotals(**values)
 
 
 # ========== Parse (name, qty, amount → rate:=amount/qty) ==========
@@ -693,6 +934,107 @@ class InvoiceLine:
     amount: Optional[float]
     rate: Optional[float]  # computed as amount/qty (preferred), else explicit rate
 
+# Sarom line item: qty, unit, rate, unit, amount. One pattern covers the
+# OCR variants of the first unit ("Mtr", "Mtr,", "Mtr~", 'Mtr"', "Mtr-",
+# "My", "Meter-") and of the second ("Mtr", "Meter", "Mu"). The junk after
+# "Mtr" is capped at 200 chars, well past any real OCR line gap, so only a
+# pathological digit-free tail is cut short instead of backtracking unbounded
+_SAROM_ITEM_RE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(?:My|Meter[,~-]?|Mtr[^\d]{0,200})\s*(\d+(?:\.\d+)?)\s*(?:Mu|Mtr|Meter)\s*([\d,]+(?:\.\d+)?)",
+    re.I,
+)
+
+# Sarom-specific noise (OCR artifacts) stripped by _clean_sarom_fabric_name, fused
+# into one alternation so the name is scanned once; whitespace is normalised after.
+# Runs are bounded to keep each attempt short on garbled OCR tokens
+_SAROM_NOISE_RE = re.compile("|".join(f"(?:{p})" for p in [
+    r'\b5%\b',  # Tax percentage
+    r'\b\d{8}\b',  # HSN codes like 55169200
+    r'\b\d{6,7}\b',  # Other numeric codes (6-7 digits)
+    r'\b\d{1,2}\b',  # Single/double digit numbers
+    r'[A-Z]{2}\d{2}[A-Z]{5}\d[A-Z]\d[A-Z]\d',  # GSTIN-like patterns
+    r'\b[A-Za-z]{8,40}\d{2,20}\b',  # Long alphanumeric codes like "Isstegz00"
+    r'\b\d{2,20}[A-Za-z]{3,40}\d{2,20}\b',  # Mixed alphanumeric codes
+    r'\b[A-Za-z]{4,40}\d{2,20}[A-Za-z]{2,40}\d{2,20}\b',  # Complex alphanumeric like "Isstegz00"
+    r'\b[A-Za-z]{6,40}\d{2,20}\b',  # Long text followed by numbers like "Isstegz00"
+    r'[^\w\s\-]',  # Remove all punctuation except hyphens
+]), re.I)
+_DIGITS_SPACES_DROP = _DropTable()
+
+# Sujan Impex item rows: <description> <8-digit HSN> <qty> Mtr <rate> Mtr <amount>,
+# read right-to-left from the whitespace tokens (units may be glued to numbers)
+_SUJAN_UNITS = ("mtr", "meter", "meters", "mtrs")
+_SUJAN_QTY_RE = re.compile(r"\d+(?:\.\d+)?")
+_SUJAN_MONEY_RE = re.compile(r"[\d,]+(?:\.\d{2})?")
+
+def _sujan_number_unit(tokens: List[str], end: int, num_re: re.Pattern) -> Optional[Tuple[str, int]]:
+    """'<number> <unit>' or '<number><unit>' ending at tokens[end] → (number, index of its first token)"""
+    tok = tokens[end]
+    low = tok.lower()
+    if low in _SUJAN_UNITS:
+        if end >= 1 and num_re.fullmatch(tokens[end - 1]):
+            return tokens[end - 1], end - 1
+        return None
+    for unit in _SUJAN_UNITS:
+        if low.endswith(unit) and num_re.fullmatch(tok[:-len(unit)]):
+            return tok[:-len(unit)], end
+    return None
+
+def _is_hsn(token: str) -> bool:
+    """8-digit HSN code"""
+    return len(token) == 8 and token.isdecimal()
+
+def _sujan_item_tokens(line: str) -> Optional[Tuple[str, str, str, str, str]]:
+    """(desc, hsn, qty, rate, amount) for a Sujan Impex item row, else None"""
+    tokens = line.split()
+    if len(tokens) < 5 or not _SUJAN_MONEY_RE.fullmatch(tokens[-1]):
+        return None
+    rate = _sujan_number_unit(tokens, len(tokens) - 2, _SUJAN_MONEY_RE)
+    if not rate or rate[1] < 3:
+        return None
+    qty = _sujan_number_unit(tokens, rate[1] - 1, _SUJAN_QTY_RE)
+    if not qty or qty[1] < 2:
+        return None
+    hsn = tokens[qty[1] - 1]
+    if not _is_hsn(hsn):
+        return None
+    return " ".join(tokens[:qty[1] - 1]), hsn, qty[0], rate[0], tokens[-1]
+
+def _parse_money(s: str) -> float:
+    """float() of an amount like '2,988.00'; skips the replace copy when there's no comma"""
+    return float(s.replace(',', '')) if ',' in s else float(s)
+
+# Home Ideas line items start with a 10-digit Order No
+_HOME_IDEAS_ITEM_START_RE = re.compile(r"^\d{10}\s")
+
+# Generic parser helpers
+_ASCII_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_ASCII_DIGITS = frozenset('0123456789')
+_HAS_DIGITS_RE = re.compile(r'\d')
+_CONTEXT_RATE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:per|/)\s*(?:mtr|meter|pcs)', re.I)
+_CONTEXT_AMT_RE = re.compile(r'₹?\s*([\d,]+(?:\.\d+)?)')
+_LEADING_NAME_RE = re.compile(r'^([A-Za-z\s\-]{1,80})')
+_FIRST_NUMBER_RE = re.compile(r'(\d+(?:\.\d+)?)')
+
+def _has_letter_and_digit(line: str) -> bool:
+    """[A-Za-z] and \d both occur in line; set.isdisjoint walks the string in C,
+    the regex is only needed for non-ASCII digits"""
+    if _ASCII_LETTERS.isdisjoint(line):
+        return False
+    return not _ASCII_DIGITS.isdisjoint(line) or (not line.isascii() and _HAS_DIGITS_RE.search(line) is not None)
+
+# Invoice noise stripped by UniversalInvoiceParser._clean_fabric_name, fused the same way
+_FABRIC_NOISE_RE = re.compile("|".join(f"(?:{p})" for p in [
+    r'\b(GSTIN|GST|IGST|CGST|SGST|Tax|Total|Sub[- ]?total|Grand Total|Invoice|Bill|Address|Ship To|PIN|Pincode|Phone|Mobile|Email)\b',
+    r'[A-Z]{2}\d{2}[A-Z]{5}\d[A-Z]\d[A-Z]\d',  # GSTIN-like
+    r'\b\d{6}\b',
+    r'\b5%\b',  # Tax percentages
+    r'\|\s*%[^|]*$',  # Trailing tax info
+    r'^\d+\s+',  # Leading line numbers
+    r'\s+\$\d+\s*',  # Dollar amounts
+    r'\s+§\d+\s*',  # Section symbols
+]), re.I)
+
 # ========== Universal Multi-Format Invoice Parser ==========
 class UniversalInvoiceParser:
     """Universal parser that can handle multiple invoice formats automatically"""
@@ -715,16 +1057,36 @@ class UniversalInvoiceParser:
                 'name_extraction': 'generic'
             }
         }
+        for format_info in self.format_patterns.values():
+            format_info['item_pattern'] = re.compile(format_info['item_pattern'])
+        # One automaton over every indicator; values are (rank, format) so the
+        # earliest-registered format still wins when several match
+        self._indicator_automaton = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for rank, (format_name, format_info) in enumerate(self.format_patterns.items()):
+                for indicator in format_info['indicators']:
+                    if indicator.lower() not in automaton:
+                        automaton.add_word(indicator.lower(), (rank, format_name))
+            automaton.make_automaton()
+            self._indicator_automaton = automaton
     
     def detect_format(self, text: str) -> str:
         """Automatically detect invoice format based on content"""
         text_lower = text.lower()
         
-        for format_name, format_info in self.format_patterns.items():
-            for indicator in format_info['indicators']:
-                if indicator.lower() in text_lower:
-                    print(f"🔍 Detected {format_name.upper()} format")
-                    return format_name
+        if self._indicator_automaton is not None:
+            hits = [value for _, value in self._indicator_automaton.iter(text_lower)]
+            if hits:
+                format_name = min(hits)[1]
+                print(f"🔍 Detected {format_name.upper()} format")
+                return format_name
+        else:
+            for format_name, format_info in self.format_patterns.items():
+                for indicator in format_info['indicators']:
+                    if indicator.lower() in text_lower:
+                        print(f"🔍 Detected {format_name.upper()} format")
+                        return format_name
         
         print("🔍 Format not detected, using generic parser")
         return 'generic'
@@ -747,54 +1109,28 @@ class UniversalInvoiceParser:
         print("📋 Parsing SAROM format...")
         fabric_details = []
         
-        # Multiple patterns for Sarom format variations
-        patterns = [
-            r"(\d+(?:\.\d+)?)\s*(?:My|Mtr|Meter|Mtr,|Mtr~|Mtr\")\s*(\d+(?:\.\d+)?)\s*(?:Mu|Mtr|Meter)\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*(?:Mtr|Meter)\s*(\d+(?:\.\d+)?)\s*(?:Mtr|Meter)\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)(?:Mtr|Meter)(?:,|~|-)\s*(\d+(?:\.\d+)?)\s*(?:Mtr|Meter)\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr~\s*,?\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr,\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr\"\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*(?:Mtr|Meter)\s*(\d+(?:\.\d+)?)\s*(?:Mtr|Meter)\s*([\d,]+(?:\.\d+)?)",
-            # Additional patterns for OCR variations
-            r"(\d+(?:\.\d+)?)\s*Mtr\"\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr-\s*(\d+(?:\.\d+)?)\s*Mu\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            # Pattern for incomplete amounts (missing last digit)
-            r"(\d+(?:\.\d+)?)\s*Mtr\"\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            # More flexible amount pattern for incomplete amounts
-            r"(\d+(?:\.\d+)?)\s*Mtr\"\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            # Very flexible pattern for problematic lines like CASSIA - 115
-            r"(\d+(?:\.\d+)?)\s*Mtr[^\d]*\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-            r"(\d+(?:\.\d+)?)\s*Mtr[^\d]*\s*(\d+(?:\.\d+)?)\s*Mtr\s*([\d,]+(?:\.\d+)?)",
-        ]
-        
-        lines = text.split('\n')
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line or len(line) < 10:
+        # Strip once and drop blank/short lines up front
+        lines = [ln for ln in map(str.strip, text.split('\n')) if len(ln) >= 10]
+        for line in lines:
+            # Every item line ends its rate with a unit: skip the rest without a regex
+            low = line.lower()
+            if 'mtr' not in low and 'mu' not in low and 'meter' not in low:
                 continue
             
-            # Try all patterns
-            for pattern in patterns:
-                match = re.search(pattern, line, re.I)
-                if match:
-                    qty = float(match.group(1))
-                    rate = float(match.group(2))
-                    amount = float(match.group(3).replace(',', ''))
-                    
-                    # Extract material name - everything before the first number
-                    name_part = line[:match.start()].strip()
-                    if name_part:
-                        # Clean the name more aggressively for Sarom format
-                        clean_name = self._clean_sarom_fabric_name(name_part)
-                        if clean_name and len(clean_name) >= 3:
-                            print(f"   ✅ {clean_name} | Qty: {qty} | Rate: {rate} | Amount: {amount}")
-                            fabric_details.append(InvoiceLine(material_name=clean_name, quantity=qty, amount=amount, rate=rate))
-                            break
+            match = _SAROM_ITEM_RE.search(line)
+            if match:
+                qty = float(match.group(1))
+                rate = float(match.group(2))
+                amount = _parse_money(match.group(3))
+                
+                # Extract material name - everything before the first number
+                name_part = line[:match.start()].strip()
+                if name_part:
+                    # Clean the name more aggressively for Sarom format
+                    clean_name = self._clean_sarom_fabric_name(name_part)
+                    if clean_name and len(clean_name) >= 3:
+                        print(f"   ✅ {clean_name} | Qty: {qty} | Rate: {rate} | Amount: {amount}")
+                        fabric_details.append(InvoiceLine(material_name=clean_name, quantity=qty, amount=amount, rate=rate))
         
         print(f"📊 SAROM format: Found {len(fabric_details)} fabric items")
         return fabric_details
@@ -805,63 +1141,46 @@ class UniversalInvoiceParser:
             return ""
         
         # Remove common Sarom-specific noise patterns
-        noise_patterns = [
-            r'\b5%\b',  # Tax percentage
-            r'\b\d{8}\b',  # HSN codes like 55169200
-            r'\b\d{6,7}\b',  # Other numeric codes (6-7 digits)
-            r'\b\d{1,2}\b',  # Single/double digit numbers
-            r'[A-Z]{2}\d{2}[A-Z]{5}\d[A-Z]\d[A-Z]\d',  # GSTIN-like patterns
-            r'\b[A-Za-z]{8,}\d{2,}\b',  # Long alphanumeric codes like "Isstegz00"
-            r'\b\d{2,}[A-Za-z]{3,}\d{2,}\b',  # Mixed alphanumeric codes
-            r'\b[A-Za-z]{4,}\d{2,}[A-Za-z]{2,}\d{2,}\b',  # Complex alphanumeric like "Isstegz00"
-            r'\b[A-Za-z]{6,}\d{2,}\b',  # Long text followed by numbers like "Isstegz00"
-            r'[^\w\s\-]',  # Remove all punctuation except hyphens
-            r'\s+',  # Multiple spaces
-            r'^\s+|\s+$',  # Leading/trailing spaces
-        ]
-        
-        for pattern in noise_patterns:
-            name = re.sub(pattern, " ", name, flags=re.I)
+        name = _SAROM_NOISE_RE.sub(" ", name)
         
         # Clean up extra whitespace and normalize
-        name = re.sub(r'\s+', ' ', name).strip()
+        name = _WS_RE.sub(' ', name).strip()
         
         # Remove leading/trailing hyphens and clean up
-        name = re.sub(r'^[-]+|[-]+$', '', name)
-        name = name.strip()
+        name = name.strip('-').strip()
         
         # Return if meaningful
-        if len(name) >= 3 and not re.fullmatch(r'[\d\s]+', name):
+        if len(name) >= 3 and name.translate(_DIGITS_SPACES_DROP):
             return name
         
         return ""
     
     def _parse_sujan_impex_format(self, text: str) -> List[InvoiceLine]:
-        """Parse Sujan Impex format using working regex pattern for HSN/Qty/Rate/Amount"""
+        """Parse Sujan Impex format: one item per line, HSN/Qty/Rate/Amount at the right"""
         print("📋 Parsing SUJAN IMPEX format...")
         fabric_details = []
         
-        # Use the working regex pattern for Sujan Impex layout
-        ITEM_LINE_RE = re.compile(
-            r"""(?m)^
-                (?P<desc>.+?)                         # description until HSN
-                \s+(?P<hsn>\d{8})\s+                  # 8-digit HSN
-                (?P<qty>\d+(?:\.\d+)?)\s*(?:MTR|Mtr|Meter|Meters|Mtrs)\s+
-                (?P<rate>[\d,]+(?:\.\d{2})?)\s*(?:MTR|Mtr|Meter|Meters|Mtrs)\s+
-                (?P<amount>[\d,]+(?:\.\d{2})?)
-                \s*$
-            """,
-            re.IGNORECASE | re.VERBOSE
-        )
-        
-        for match in ITEM_LINE_RE.finditer(text):
-            desc_raw = re.sub(r"\s+", " ", match.group("desc")).strip()
-            qty = float(match.group("qty"))
-            rate = float(match.group("rate").replace(",", ""))
-            amount = float(match.group("amount").replace(",", ""))
+        # Tokenize each line and read HSN/Qty/Rate/Amount from the right.
+        # pdfplumber can wrap a row so the HSN starts the next line; such a line
+        # is rejoined with the last non-blank line above when that one has no HSN
+        prev = ""
+        for line in text.split('\n'):
+            tokens = line.split()
+            if not tokens:
+                continue
+            item = _sujan_item_tokens(line)
+            if not item and prev and _is_hsn(tokens[0]):
+                item = _sujan_item_tokens(prev + " " + line)
+            prev = "" if item or any(_is_hsn(t) for t in tokens) else line
+            if not item:
+                continue
+            desc_raw, hsn, qty, rate, amount = item
+            qty = float(qty)
+            rate = _parse_money(rate)
+            amount = _parse_money(amount)
             
             print(f"   🔍 Found item: {desc_raw}")
-            print(f"      📏 HSN: {match.group('hsn')}, Qty: {qty}, Rate: {rate}, Amount: {amount}")
+            print(f"      📏 HSN: {hsn}, Qty: {qty}, Rate: {rate}, Amount: {amount}")
             
             # Clean the fabric name
             clean_name = self._clean_fabric_name(desc_raw)
@@ -887,10 +1206,8 @@ class UniversalInvoiceParser:
         lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
         
         # Look for line items that start with a 10-digit Order No
-        starts_line_item = re.compile(r"^\d{10}\s")
-        
         for line in lines:
-            if starts_line_item.match(line):
+            if line[:10].isdigit() and _HOME_IDEAS_ITEM_START_RE.match(line):
                 print(f"   🔍 Found line item: {line}")
                 
                 # Tokenize the line and parse from the right side
@@ -898,16 +1215,11 @@ class UniversalInvoiceParser:
                 
                 # Expect at least: [order_no] [collection words ...] [sr_no] [rl/cl] [dc_no] [lr] [meters] [rate] [basic] [taxable]
                 if len(tokens) >= 11:
-                    order_no = tokens[0]
-                    basic = tokens[-2]      # Basic Price
-                    taxable = tokens[-1]    # Taxable Value  
-                    rate = tokens[-3]       # Rate per meter
-                    meters = tokens[-4]     # Meters/Quantity
-                    lr = tokens[-5]         # LR Details
-                    dc_no = tokens[-6]      # DC No
-                    rlcl = tokens[-7]       # RL/CL
-                    sr_no = tokens[-8]      # Sr No
-                    collection = " ".join(tokens[1:-8])  # Everything between order_no and sr_no
+                    # One unpack instead of nine index lookups plus a slice:
+                    # collection words sit between order_no and sr_no; meters is the quantity,
+                    # rate is per meter, basic is the Basic Price, taxable the Taxable Value
+                    order_no, *collection_words, sr_no, rlcl, dc_no, lr, meters, rate, basic, taxable = tokens
+                    collection = " ".join(collection_words)
                     
                     print(f"      📋 Order: {order_no}, Collection: {collection}")
                     print(f"      📏 Meters: {meters}, Rate: {rate}, Basic: {basic}")
@@ -915,8 +1227,8 @@ class UniversalInvoiceParser:
                     try:
                         # Convert to proper types
                         qty = float(meters)
-                        rate_val = float(rate.replace(',', ''))
-                        amount = float(basic.replace(',', ''))
+                        rate_val = _parse_money(rate)
+                        amount = _parse_money(basic)
                         
                         # Validate the data
                         if qty > 0 and rate_val > 0 and amount > 0:
@@ -950,15 +1262,15 @@ class UniversalInvoiceParser:
         print("📋 Using generic parser...")
         fabric_details = []
         
-        lines = text.split('\n')
+        # Strip once; short lines stay in place as context for their neighbours
+        lines = [ln.strip() for ln in text.split('\n')]
         
         for i, line in enumerate(lines):
-            line = line.strip()
-            if not line or len(line) < 10:
+            if len(line) < 10:
                 continue
             
             # Look for any line with numbers and text that might be fabric
-            if re.search(r'[A-Za-z]', line) and re.search(r'\d+', line):
+            if _has_letter_and_digit(line):
                 name, qty, rate, amount = self._extract_fabric_from_line(line, lines, i)
                 
                 if name and qty and rate and amount:
@@ -981,7 +1293,7 @@ class UniversalInvoiceParser:
             
             # Look for rate patterns
             if not rate:
-                rate_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:per|/)\s*(?:mtr|meter|pcs)', line, re.I)
+                rate_match = _CONTEXT_RATE_RE.search(line)
                 if rate_match and rate_match.group(1):
                     try:
                         rate = float(rate_match.group(1))
@@ -990,12 +1302,15 @@ class UniversalInvoiceParser:
             
             # Look for amount patterns
             if not amount:
-                amt_match = re.search(r'₹?\s*([\d,]+(?:\.\d+)?)', line)
+                amt_match = _CONTEXT_AMT_RE.search(line)
                 if amt_match and amt_match.group(1):
                     try:
-                        amount = float(amt_match.group(1).replace(',', ''))
+                        amount = _parse_money(amt_match.group(1))
                     except ValueError:
                         pass
+            
+            if rate and amount:
+                break
         
         return rate, amount
     
@@ -1008,12 +1323,12 @@ class UniversalInvoiceParser:
         amount = None
         
         # Extract name (text before first number)
-        name_match = re.match(r'^([A-Za-z\s\-]+)', line)
+        name_match = _LEADING_NAME_RE.match(line)
         if name_match:
             name = name_match.group(1).strip()
         
         # Extract quantity
-        qty_match = re.search(r'(\d+(?:\.\d+)?)', line)
+        qty_match = _FIRST_NUMBER_RE.search(line)
         if qty_match:
             qty = float(qty_match.group(1))
         
@@ -1028,26 +1343,14 @@ class UniversalInvoiceParser:
             return ""
         
         # Remove common invoice noise but be more conservative
-        noise_patterns = [
-            r'\b(GSTIN|GST|IGST|CGST|SGST|Tax|Total|Sub[- ]?total|Grand Total|Invoice|Bill|Address|Ship To|PIN|Pincode|Phone|Mobile|Email)\b',
-            r'[A-Z]{2}\d{2}[A-Z]{5}\d[A-Z]\d[A-Z]\d',  # GSTIN-like
-            r'\b\d{6}\b',
-            r'\b5%\b',  # Tax percentages
-            r'\|\s*%[^|]*$',  # Trailing tax info
-            r'^\d+\s+',  # Leading line numbers
-            r'\s+\$\d+\s*',  # Dollar amounts
-            r'\s+§\d+\s*',  # Section symbols
-        ]
-        
-        for pattern in noise_patterns:
-            name = re.sub(pattern, "", name, flags=re.I)
+        name = _FABRIC_NOISE_RE.sub("", name)
         
         # Clean up extra whitespace
-        name = re.sub(r'\s+', ' ', name).strip()
-        name = re.sub(r'^[:\-\s|]+|[:\-\s|]+$', '', name)
+        name = _WS_RE.sub(' ', name).strip()
+        name = name.strip(": -|")
         
         # Return if meaningful
-        if len(name) >= 3 and not re.fullmatch(r'[₹\d\s\.,/-]+', name):
+        if len(name) >= 3 and name.translate(_NUMERIC_ONLY_DROP):
             return name
         
         return ""
@@ -1063,9 +1366,34 @@ class MatchRow:
     score: float
     status: str  # "✅ MATCH" | "❌ MISMATCH" | "ℹ️ NOT FOUND"
 
-def compare(inv_lines: List[InvoiceLine], db_items: List[DBItem]) -> List[MatchRow]:
-    tol = float(os.getenv("RATE_TOLERANCE_PCT", "0.10"))
+@dataclass(slots=True)
+class PriceRow:
+    fabric_name: str
+    invoice_rate: float
+    database_price: float
+    difference: float = 0.0
+    difference_pct: float = 0.0
+    severity: str = ""  # "HIGH" | "MEDIUM" | "LOW" (mismatches only)
+
+_RATE_TOL = float(os.getenv("RATE_TOLERANCE_PCT", "0.10"))
+
+# (db_items, ids of its items, index) of the last list compare() indexed
+_last_db_index: Optional[Tuple[List[DBItem], Tuple[int, ...], DBIndex]] = None
+
+def _db_index_for(db_items: List[DBItem]) -> DBIndex:
+    """build_db_index, reused while compare() keeps getting the same unchanged list"""
+    global _last_db_index
+    ids = tuple(map(id, db_items))
+    cached = _last_db_index
+    if cached and cached[0] is db_items and cached[1] == ids:
+        return cached[2]
     db_index = build_db_index(db_items)
+    _last_db_index = (db_items, ids, db_index)
+    return db_index
+
+def compare(inv_lines: List[InvoiceLine], db_items: List[DBItem]) -> List[MatchRow]:
+    tol = _RATE_TOL
+    db_index = _db_index_for(db_items)
     rows: List[MatchRow] = []
 
     for il in inv_lines:
@@ -1093,7 +1421,7 @@ def compare(inv_lines: List[InvoiceLine], db_items: List[DBItem]) -> List[MatchR
     return rows
 
 # ========== Enhanced Main Function ==========
-def main():
+def _main():
     if len(sys.argv) < 2:
         print("Usage: python test_basic_ocr.py /path/to/invoice.(pdf|png|jpg|...)")
         sys.exit(2)
@@ -1109,6 +1437,7 @@ def main():
     text = extract_text(invoice_path)
     if not text:
         print("No text extracted."); sys.exit(1)
+    text_lower = text.lower()
 
     # If this is a Home Ideas / D'Decor invoice, pull totals
     totals = extract_homeideas_totals(text)
@@ -1153,18 +1482,13 @@ def main():
     taxes = extract_cgst_sgst_roundoff(text)
     
     # Check if this is a Sujan Impex invoice
-    is_sujan_impex = 'sujan impex' in text.lower() or out_igst is not None
+    is_sujan_impex = 'sujan impex' in text_lower or out_igst is not None
     
-    if not is_sujan_impex:
-        # Check if "SALES" is mentioned in the invoice to adjust labels
-        has_sales = 'sales' in text.lower()
-        cgst_label = "CGST SALES" if has_sales else "CGST"
-        sgst_label = "SGST SALES" if has_sales else "SGST"
-        
-        # print("\n🧾 TAX (Sarom):")
-        # print(f"   GST Rate   : {('%.1f%%' % taxes.gst_rate) if taxes.gst_rate is not None else '—'}")
-        # print(f"   {cgst_label:<12}: {('₹%.2f' % taxes.cgst) if taxes.cgst is not None else '—'}")
-        # print(f"   {sgst_label:<12}: {('₹%.2f' % taxes.sgst) if taxes.sgst is not None else '—'}")
+    # if not is_sujan_impex:
+    #     print("\n🧾 TAX (Sarom):")
+    #     print(f"   GST Rate   : {('%.1f%%' % taxes.gst_rate) if taxes.gst_rate is not None else '—'}")
+    #     print(f"   {taxes.cgst_label:<12}: {('₹%.2f' % taxes.cgst) if taxes.cgst is not None else '—'}")
+    #     print(f"   {taxes.sgst_label:<12}: {('₹%.2f' % taxes.sgst) if taxes.sgst is not None else '—'}")
 
     print("→ Parsing with Universal Multi-Format Parser…")
     
@@ -1184,6 +1508,12 @@ def main():
         print("⚠️ No DB rows loaded. Continuing with CSV matching only...")
         db = []
 
+    # The report below is hundreds of print() calls; on a terminal stdout is
+    # line-buffered and flushes on every one. Block-buffer it; main() flushes
+    # once and restores the caller's setting.
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(line_buffering=False)
+
     print("\n🔍 CSV FABRIC MATCHING RESULTS:")
     print("=" * 120)
     print(f"{'Invoice Name':<40} {'Qty':>8} {'Rate':>12} {'Amount':>12} {'CSV Match':<50} {'CSV Price':>12} {'Method':<25} {'Score':>6}")
@@ -1192,10 +1522,20 @@ def main():
     total_invoice_value = 0
     total_csv_value = 0
     matched_items = 0
+    # Price mismatch summary buckets, filled during the results loop below
+    price_mismatches = []
+    minor_differences = []
+    exact_matches = []
+    
+    # Fuzzy-match each distinct invoice name once; the mismatch summary reuses these
+    matches: Dict[str, Optional[dict]] = {}
+    for line in inv:
+        if line.material_name not in matches:
+            matches[line.material_name] = find_csv_fabric_match(line.material_name, csv_fabrics)
     
     for line in inv:
         # Find CSV match
-        csv_match = find_csv_fabric_match(line.material_name, csv_fabrics)
+        csv_match = matches[line.material_name]
         
         # Calculate amounts
         amount = line.amount if line.amount else (line.rate * line.quantity if line.rate and line.quantity else 0)
@@ -1212,6 +1552,17 @@ def main():
                 price_diff = abs(line.rate - csv_price)
                 price_diff_pct = (price_diff / csv_price) * 100
                 
+                if csv_price > 0:
+                    if price_diff_pct == 0:  # Exact match
+                        exact_matches.append(PriceRow(line.material_name, line.rate, csv_price))
+                    elif price_diff_pct > 2:  # More than 2% difference
+                        price_mismatches.append(PriceRow(
+                            line.material_name, line.rate, csv_price, price_diff, price_diff_pct,
+                            severity='HIGH' if price_diff_pct > 10 else 'MEDIUM' if price_diff_pct > 5 else 'LOW'
+                        ))
+                    elif price_diff_pct > 0:  # Minor differences (0-2%)
+                        minor_differences.append(PriceRow(line.material_name, line.rate, csv_price, price_diff, price_diff_pct))
+                
                 # More granular price difference categories with clearer mismatch indicators
                 if price_diff_pct == 0:
                     status = "✅ MATCHED WITH DATABASE (Price: ✅ EXACT MATCH)"
@@ -1314,62 +1665,24 @@ def main():
     # Add price mismatch summary
     if total_csv_value > 0:
         print(f"\n🚨 PRICE MISMATCH SUMMARY:")
-        price_mismatches = []
-        minor_differences = []
-        exact_matches = []
-        
-        for line in inv:
-            csv_match = find_csv_fabric_match(line.material_name, csv_fabrics)
-            if csv_match and line.rate:
-                csv_price = float(csv_match['fabric']['default_price']) if csv_match['fabric']['default_price'] else 0
-                if csv_price > 0:
-                    price_diff = abs(line.rate - csv_price)
-                    price_diff_pct = (price_diff / csv_price) * 100
-                    
-                    if price_diff_pct == 0:  # Exact match
-                        exact_info = {
-                            'fabric_name': line.material_name,
-                            'invoice_rate': line.rate,
-                            'database_price': csv_price
-                        }
-                        exact_matches.append(exact_info)
-                    elif price_diff_pct > 2:  # More than 2% difference
-                        mismatch_info = {
-                            'fabric_name': line.material_name,
-                            'invoice_rate': line.rate,
-                            'database_price': csv_price,
-                            'difference': price_diff,
-                            'difference_pct': price_diff_pct,
-                            'severity': 'HIGH' if price_diff_pct > 10 else 'MEDIUM' if price_diff_pct > 5 else 'LOW'
-                        }
-                        price_mismatches.append(mismatch_info)
-                    elif price_diff_pct > 0:  # Minor differences (0-2%)
-                        minor_info = {
-                            'fabric_name': line.material_name,
-                            'invoice_rate': line.rate,
-                            'database_price': csv_price,
-                            'difference': price_diff,
-                            'difference_pct': price_diff_pct
-                        }
-                        minor_differences.append(minor_info)
         
         # Show exact matches first
         if exact_matches:
             print(f"   ✅ Items with EXACT Price Match:")
             for exact in exact_matches:
-                print(f"      🟢 {exact['fabric_name'][:35]:<35} | "
-                      f"Invoice: ₹{exact['invoice_rate']:>8.2f} | "
-                      f"Database: ₹{exact['database_price']:>8.2f} | "
+                print(f"      🟢 {exact.fabric_name[:35]:<35} | "
+                      f"Invoice: ₹{exact.invoice_rate:>8.2f} | "
+                      f"Database: ₹{exact.database_price:>8.2f} | "
                       f"Status: ✅ PERFECT MATCH")
         
         # Show minor differences
         if minor_differences:
             print(f"\n   🟡 Items with Minor Price Differences (0-2%):")
             for minor in minor_differences:
-                print(f"      🟡 {minor['fabric_name'][:35]:<35} | "
-                      f"Invoice: ₹{minor['invoice_rate']:>8.2f} | "
-                      f"Database: ₹{minor['database_price']:>8.2f} | "
-                      f"Diff: ₹{minor['difference']:>6.2f} ({minor['difference_pct']:>5.1f}%) | "
+                print(f"      🟡 {minor.fabric_name[:35]:<35} | "
+                      f"Invoice: ₹{minor.invoice_rate:>8.2f} | "
+                      f"Database: ₹{minor.database_price:>8.2f} | "
+                      f"Diff: ₹{minor.difference:>6.2f} ({minor.difference_pct:>5.1f}%) | "
                       f"Status: ⚠️ MINOR DIFFERENCE")
         
         # Show significant mismatches prominently
@@ -1377,13 +1690,13 @@ def main():
             print(f"\n   🔴 ITEMS WITH PRICE MISMATCHES (>2%):")
             print(f"   ⚠️  THESE PRICES DON'T MATCH THE DATABASE!")
             for mismatch in price_mismatches:
-                severity_icon = "🔴" if mismatch['severity'] == 'HIGH' else "🟡" if mismatch['severity'] == 'MEDIUM' else "🟢"
-                print(f"      {severity_icon} {mismatch['fabric_name'][:35]:<35} | "
-                      f"Invoice: ₹{mismatch['invoice_rate']:>8.2f} | "
-                      f"Database: ₹{mismatch['database_price']:>8.2f} | "
-                      f"Diff: ₹{mismatch['difference']:>6.2f} ({mismatch['difference_pct']:>5.1f}%) | "
+                severity_icon = "🔴" if mismatch.severity == 'HIGH' else "🟡" if mismatch.severity == 'MEDIUM' else "🟢"
+                print(f"      {severity_icon} {mismatch.fabric_name[:35]:<35} | "
+                      f"Invoice: ₹{mismatch.invoice_rate:>8.2f} | "
+                      f"Database: ₹{mismatch.database_price:>8.2f} | "
+                      f"Diff: ₹{mismatch.difference:>6.2f} ({mismatch.difference_pct:>5.1f}%) | "
                       f"Status: ❌ PRICE DOESN'T MATCH | "
-                      f"Severity: {mismatch['severity']}")
+                      f"Severity: {mismatch.severity}")
         else:
             print(f"\n   ✅ No significant price differences found (>2%)")
         
@@ -1408,37 +1721,15 @@ def main():
     if taxes.gst_rate is not None:
         print(f"      GST Rate: {taxes.gst_rate:.1f}%")
     if taxes.cgst is not None:
-        # Define labels here for tax summary
-        has_sales = 'sales' in text.lower()
-        cgst_label = "CGST SALES" if has_sales else "CGST"
-        sgst_label = "SGST SALES" if has_sales else "SGST"
-        print(f"      {cgst_label}: ₹{taxes.cgst:.2f}")
+        print(f"      {taxes.cgst_label}: ₹{taxes.cgst:.2f}")
     if taxes.sgst is not None:
-        # Define labels here for tax summary
-        has_sales = 'sales' in text.lower()
-        cgst_label = "CGST SALES" if has_sales else "CGST"
-        sgst_label = "SGST SALES" if has_sales else "SGST"
-        print(f"      {sgst_label}: ₹{taxes.sgst:.2f}")
+        print(f"      {taxes.sgst_label}: ₹{taxes.sgst:.2f}")
         
         # Add Home Ideas / D'Decor totals to tax summary
-        if totals.sub_total is not None:
-            print(f"      Sub Total: ₹{totals.sub_total:.2f}")
-        if totals.courier_charges is not None:
-            print(f"      Courier Charges: ₹{totals.courier_charges:.2f}")
-        if totals.add_charges is not None:
-            print(f"      Add/Charges: ₹{totals.add_charges:.2f}")
-        if totals.taxable_value is not None:
-            print(f"      Taxable Value: ₹{totals.taxable_value:.2f}")
-        if totals.tcs_amount is not None:
-            print(f"      TCS Amount: ₹{totals.tcs_amount:.2f}")
-        if totals.igst_amount is not None:
-            print(f"      IGST Amount: ₹{totals.igst_amount:.2f}")
-        if totals.cgst_amount is not None:
-            print(f"      CGST Amount: ₹{totals.cgst_amount:.2f}")
-        if totals.sgst_amount is not None:
-            print(f"      SGST Amount: ₹{totals.sgst_amount:.2f}")
-        if totals.total_inc_taxes is not None:
-            print(f"      TOTAL INC. TAXES: ₹{totals.total_inc_taxes:.2f}")
+        for attr, label in _HOMEIDEAS_TOTAL_FIELDS:
+            value = getattr(totals, attr)
+            if value is not None:
+                print(f"      {label}: ₹{value:.2f}")
     
     if db:
         print(f"\n🔍 LEGACY DB COMPARISON RESULTS:")
@@ -1454,5 +1745,16 @@ def main():
     else:
         print(f"\n⚠️ Legacy DB comparison skipped (no DB items loaded)")
 
+def main():
+    line_buffering = getattr(sys.stdout, "line_buffering", False)
+    try:
+        _main()
+    finally:
+        # However _main ends (sys.exit included): flush the report and give the
+        # process stdout back its original buffering mode
+        sys.stdout.flush()
+        if line_buffering and hasattr(sys.stdout, "reconfigure"):
+            sys.stdout.reconfigure(line_buffering=True)
+
 if __name__ == "__main__":
     main()
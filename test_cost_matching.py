@@ -6,10 +6,13 @@ Matches extracted fabric costs/quantities with database prices for validation.
 
 import config  # This sets up the environment variables
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
 # Import our custom modules
-from fabric_matcher import FabricMatcher, ParsedFabric, DatabaseFabric, load_database_fabrics
+from fabric_matcher import FabricMatcher, ParsedFabric, DatabaseFabric, load_database_fabrics, normalize_string
 
 # Import the parsing functionality from test_basic_ocr.py
 sys.path.append('.')
@@ -19,6 +22,27 @@ except ImportError:
     print("❌ Could not import parsing functionality. Make sure test_basic_ocr.py is in the same directory.")
     sys.exit(1)
 
+_MATCHER = None
+
+def get_matcher():
+    """FabricMatcher over the database fabrics, loaded and indexed once per process so
+    analyzing several invoices doesn't rebuild it; None if nothing could be loaded"""
+    global _MATCHER
+    if _MATCHER is None:
+        # Step 3: Load database fabrics
+        print("🔗 Loading database fabrics...")
+        db_fabrics = load_database_fabrics()
+        if not db_fabrics:
+            print("❌ No database fabrics loaded")
+            return None
+        
+        print(f"✅ Loaded {len(db_fabrics)} fabrics from database")
+        
+        # Step 4: Initialize fabric matcher
+        print("🎯 Initializing fabric matcher...")
+        _MATCHER = FabricMatcher(db_fabrics)
+    return _MATCHER
+
 def analyze_cost_matching(invoice_path: str):
     """
     Parse invoice and analyze cost matching with database
@@ -26,6 +50,14 @@ def analyze_cost_matching(invoice_path: str):
     print(f"🔍 Analyzing Cost Matching for: {invoice_path}")
     print("=" * 80)
     
+    # Steps 3-4 don't depend on the invoice: load the database and build the matcher
+    # in a background thread while the (often multi-second) text extraction runs.
+    # Its progress messages can interleave with the extraction output; the OCR
+    # process pool uses spawn, so this running thread is never forked
+    pool = ThreadPoolExecutor(max_workers=1)
+    matcher_future = pool.submit(get_matcher)
+    pool.shutdown(wait=False)
+    
     # Step 1: Extract text from invoice
     print("📄 Extracting text from invoice...")
     text = extract_text(invoice_path)
@@ -44,137 +76,142 @@ def analyze_cost_matching(invoice_path: str):
     
     print(f"✅ Found {len(parsed_fabrics)} fabric items")
     
-    # Step 3: Load database fabrics
-    print("🔗 Loading database fabrics...")
-    db_fabrics = load_database_fabrics()
-    if not db_fabrics:
-        print("❌ No database fabrics loaded")
+    # Steps 3-4: Database fabrics and matcher (built on the first invoice only)
+    matcher = matcher_future.result()
+    if matcher is None:
         return []
     
-    print(f"✅ Loaded {len(db_fabrics)} fabrics from database")
-    
-    # Step 4: Initialize fabric matcher
-    print("🎯 Initializing fabric matcher...")
-    matcher = FabricMatcher(db_fabrics)
-    
-    # Step 5: Match each parsed fabric and analyze costs
-    print("\n🔍 Cost Matching Analysis:")
-    print("-" * 80)
-    
+    # Step 5: Match each parsed fabric against the database. Every matcher algorithm
+    # only sees normalize_string(name), so rows repeating a name are matched once.
+    source_invoice = Path(invoice_path).name
     results = []
-    total_invoice_value = 0
-    total_db_value = 0
-    matched_count = 0
-    price_discrepancies = []
-    
-    for i, fabric in enumerate(parsed_fabrics):
-        print(f"\n{i+1:2d}. 🔍 {fabric.material_name}")
-        print(f"    📏 Quantity: {fabric.quantity} | Invoice Rate: ₹{fabric.rate} | Amount: ₹{fabric.amount}")
-        
+    parsed = []  # ParsedFabric per row: missing quantity/rate/amount become 0
+    matches_by_name = {}
+    for fabric in parsed_fabrics:
         # Convert InvoiceLine to ParsedFabric
         parsed_fabric = ParsedFabric(
             material_name=fabric.material_name,
             quantity=fabric.quantity or 0,
             rate=fabric.rate or 0,
             amount=fabric.amount or 0,
-            source_invoice=Path(invoice_path).name
+            source_invoice=source_invoice
         )
-        
-        # Match against database
-        match_result = matcher.match_fabric(parsed_fabric)
+        parsed.append(parsed_fabric)
+        key = normalize_string(fabric.material_name)
+        cached = matches_by_name.get(key)
+        if cached is None:
+            matches_by_name[key] = match_result = matcher.match_fabric(parsed_fabric)
+        else:
+            # Same DB match; rebuilt so price metrics use this row's rate
+            match_result = matcher.rematch(parsed_fabric, cached)
         results.append(match_result)
+    
+    # Step 6: Cost arithmetic for all matched fabrics at once
+    matched = [i for i, r in enumerate(results) if r.database_fabric]
+    matched_count = len(matched)
+    qty = np.array([parsed[i].quantity for i in matched], dtype=np.float64)
+    inv_rate = np.array([parsed[i].rate for i in matched], dtype=np.float64)
+    db_rate = np.array([results[i].database_fabric.default_purchase_price or 0 for i in matched], dtype=np.float64)
+    amount = np.array([parsed[i].amount for i in matched], dtype=np.float64)
+    
+    # A DB price of 0 means "not set": no percentage is computed for those rows
+    no_db_price = db_rate == 0
+    diff = np.abs(inv_rate - db_rate)
+    diff_pct = np.divide(diff, db_rate, out=np.zeros_like(diff), where=~no_db_price) * 100
+    inv_total = qty * inv_rate
+    db_total = qty * db_rate
+    amount_ok = np.abs(inv_total - amount) <= 1  # Allow 1 rupee tolerance
+    
+    total_invoice_value = float(inv_total.sum()) + sum(f.amount for r, f in zip(results, parsed) if not r.database_fabric)
+    total_db_value = float(db_total.sum())
+    
+    # Anything outside the 5% band (review or investigate) is a discrepancy
+    price_discrepancies = [{
+        'fabric': parsed_fabrics[matched[k]].material_name,
+        'invoice_price': inv_rate[k],
+        'db_price': db_rate[k],
+        'difference_percent': diff_pct[k],
+        'quantity': qty[k],
+        'impact': diff[k] * qty[k]
+    } for k in np.flatnonzero(~no_db_price & (diff_pct > 5))]
+    
+    # The report is built as a list of lines and written in one go
+    out = []
+    emit = out.append
+    
+    emit("\n🔍 Cost Matching Analysis:")
+    emit("-" * 80)
+    
+    k = 0  # position of the current fabric in the matched arrays
+    for i, (fabric, match_result) in enumerate(zip(parsed_fabrics, results)):
+        emit(f"\n{i+1:2d}. 🔍 {fabric.material_name}")
+        emit(f"    📏 Quantity: {fabric.quantity} | Invoice Rate: ₹{fabric.rate} | Amount: ₹{fabric.amount}")
         
         if match_result.database_fabric:
-            matched_count += 1
             db_fabric = match_result.database_fabric
             db_price = db_fabric.default_purchase_price
             
-            print(f"    ✅ MATCH: {db_fabric.material_name}")
-            print(f"    🎯 Algorithm: {match_result.match_algorithm}")
-            print(f"    📊 Score: {match_result.match_score:.1f}%")
-            print(f"    🏷️ Confidence: {match_result.confidence_level}")
-            print(f"    💰 DB Default Price: ₹{db_price}")
-            
-            # Calculate cost comparisons
-            invoice_cost_per_unit = fabric.rate
-            db_cost_per_unit = db_price
-            cost_difference = abs(invoice_cost_per_unit - db_cost_per_unit)
-            cost_difference_percent = (cost_difference / db_cost_per_unit) * 100
+            emit(f"    ✅ MATCH: {db_fabric.material_name}")
+            emit(f"    🎯 Algorithm: {match_result.match_algorithm}")
+            emit(f"    📊 Score: {match_result.match_score:.1f}%")
+            emit(f"    🏷️ Confidence: {match_result.confidence_level}")
+            emit(f"    💰 DB Default Price: ₹{db_price}")
             
-            # Calculate total values
-            invoice_total = fabric.quantity * fabric.rate
-            db_total = fabric.quantity * db_price
-            total_invoice_value += invoice_total
-            total_db_value += db_total
-            
-            print(f"    📊 Cost Analysis:")
-            print(f"       Invoice Cost/Unit: ₹{invoice_cost_per_unit}")
-            print(f"       DB Cost/Unit: ₹{db_cost_per_unit}")
-            print(f"       Difference: ₹{cost_difference:.2f} ({cost_difference_percent:.1f}%)")
+            emit(f"    📊 Cost Analysis:")
+            emit(f"       Invoice Cost/Unit: ₹{fabric.rate}")
+            emit(f"       DB Cost/Unit: ₹{db_price}")
+            pct = "no DB price" if no_db_price[k] else f"{diff_pct[k]:.1f}%"
+            emit(f"       Difference: ₹{diff[k]:.2f} ({pct})")
             
             # Price validation with color coding
-            if cost_difference_percent <= 5:
-                print(f"       🟢 Price within 5% tolerance - VALID")
-            elif cost_difference_percent <= 15:
-                print(f"       🟡 Price within 15% tolerance - REVIEW")
-                price_discrepancies.append({
-                    'fabric': fabric.material_name,
-                    'invoice_price': invoice_cost_per_unit,
-                    'db_price': db_cost_per_unit,
-                    'difference_percent': cost_difference_percent,
-                    'quantity': fabric.quantity,
-                    'impact': cost_difference * fabric.quantity
-                })
+            if no_db_price[k]:
+                emit(f"       ⚪ DB price not set - cannot validate")
+            elif diff_pct[k] <= 5:
+                emit(f"       🟢 Price within 5% tolerance - VALID")
+            elif diff_pct[k] <= 15:
+                emit(f"       🟡 Price within 15% tolerance - REVIEW")
             else:
-                print(f"       🔴 Price difference > 15% - INVESTIGATE")
-                price_discrepancies.append({
-                    'fabric': fabric.material_name,
-                    'invoice_price': invoice_cost_per_unit,
-                    'db_price': db_cost_per_unit,
-                    'difference_percent': cost_difference_percent,
-                    'quantity': fabric.quantity,
-                    'impact': cost_difference * fabric.quantity
-                })
+                emit(f"       🔴 Price difference > 15% - INVESTIGATE")
             
             # Quantity validation
-            calculated_amount = fabric.quantity * fabric.rate
-            if abs(calculated_amount - fabric.amount) <= 1:  # Allow 1 rupee tolerance
-                print(f"       ✅ Quantity × Rate = Amount calculation is correct")
+            if amount_ok[k]:
+                emit(f"       ✅ Quantity × Rate = Amount calculation is correct")
             else:
-                print(f"       ⚠️ Quantity × Rate ≠ Amount (Expected: ₹{calculated_amount}, Got: ₹{fabric.amount})")
+                emit(f"       ⚠️ Quantity × Rate ≠ Amount (Expected: ₹{float(inv_total[k])}, Got: ₹{fabric.amount})")
+            k += 1
                 
         else:
-            print(f"    ❌ NO MATCH FOUND")
-            print(f"    📊 Best Score: {match_result.match_score:.1f}%")
-            total_invoice_value += fabric.amount
+            emit(f"    ❌ NO MATCH FOUND")
+            emit(f"    📊 Best Score: {match_result.match_score:.1f}%")
     
     # Summary Report
-    print("\n" + "=" * 80)
-    print("📊 COST MATCHING SUMMARY REPORT")
-    print("=" * 80)
+    emit("\n" + "=" * 80)
+    emit("📊 COST MATCHING SUMMARY REPORT")
+    emit("=" * 80)
     
-    print(f"📋 Invoice: {Path(invoice_path).name}")
-    print(f"🔍 Total Fabric Items: {len(parsed_fabrics)}")
-    print(f"✅ Matched with Database: {matched_count}")
-    print(f"❌ No Match Found: {len(parsed_fabrics) - matched_count}")
-    print(f"📊 Match Rate: {(matched_count/len(parsed_fabrics)*100):.1f}%")
+    emit(f"📋 Invoice: {source_invoice}")
+    emit(f"🔍 Total Fabric Items: {len(parsed_fabrics)}")
+    emit(f"✅ Matched with Database: {matched_count}")
+    emit(f"❌ No Match Found: {len(parsed_fabrics) - matched_count}")
+    emit(f"📊 Match Rate: {(matched_count/len(parsed_fabrics)*100):.1f}%")
     
     if matched_count > 0:
-        print(f"\n💰 Cost Analysis:")
-        print(f"   Total Invoice Value: ₹{total_invoice_value:,.2f}")
-        print(f"   Total DB Value: ₹{total_db_value:,.2f}")
-        print(f"   Total Cost Difference: ₹{abs(total_invoice_value - total_db_value):,.2f}")
+        emit(f"\n💰 Cost Analysis:")
+        emit(f"   Total Invoice Value: ₹{total_invoice_value:,.2f}")
+        emit(f"   Total DB Value: ₹{total_db_value:,.2f}")
+        emit(f"   Total Cost Difference: ₹{abs(total_invoice_value - total_db_value):,.2f}")
         
         if total_db_value > 0:
             overall_difference_percent = (abs(total_invoice_value - total_db_value) / total_db_value) * 100
-            print(f"   Overall Difference: {overall_difference_percent:.1f}%")
+            emit(f"   Overall Difference: {overall_difference_percent:.1f}%")
     
     if price_discrepancies:
-        print(f"\n⚠️ Price Discrepancies Found:")
-        print("-" * 60)
+        emit(f"\n⚠️ Price Discrepancies Found:")
+        emit("-" * 60)
         for disc in price_discrepancies:
-            print(f"   {disc['fabric']:<30} | Invoice: ₹{disc['invoice_price']:>8.2f} | DB: ₹{disc['db_price']:>8.2f} | Diff: {disc['difference_percent']:>5.1f}% | Impact: ₹{disc['impact']:>8.2f}")
+            emit(f"   {disc['fabric']:<30} | Invoice: ₹{disc['invoice_price']:>8.2f} | DB: ₹{disc['db_price']:>8.2f} | Diff: {disc['difference_percent']:>5.1f}% | Impact: ₹{disc['impact']:>8.2f}")
     
+    sys.stdout.write("\n".join(out) + "\n")
     return results
 
 def main():
@@ -5,6 +5,9 @@ Verifies connection to Supabase and shows available fabric data.
 """
 
 import config  # This sets up the environment variables
+from itertools import islice
+
+import numpy as np
 from fabric_matcher import load_database_fabrics, DatabaseFabric
 
 def test_connection():
@@ -23,7 +26,7 @@ def test_connection():
             print("-" * 80)
             
             # Show first 10 fabrics as sample
-            for i, fabric in enumerate(fabrics[:10]):
+            for i, fabric in enumerate(islice(fabrics, 10)):
                 print(f"{i+1:2d}. {fabric.material_name:<40} | ₹{fabric.default_purchase_price:>8.2f}")
             
             if len(fabrics) > 10:
@@ -32,17 +35,18 @@ def test_connection():
             print(f"\n📈 Database Statistics:")
             print(f"   Total Fabrics: {len(fabrics)}")
             
+            # Prices and name lengths as arrays so min/max/mean run in C
+            n = len(fabrics)
+            prices = np.fromiter((f.default_purchase_price for f in fabrics), dtype=np.float64, count=n)
+            name_lengths = np.fromiter((len(f.material_name) for f in fabrics), dtype=np.int64, count=n)
+            
             # Price range analysis
-            prices = [f.default_purchase_price for f in fabrics]
-            if prices:
-                print(f"   Price Range: ₹{min(prices):.2f} - ₹{max(prices):.2f}")
-                print(f"   Average Price: ₹{sum(prices)/len(prices):.2f}")
+            print(f"   Price Range: ₹{prices.min():.2f} - ₹{prices.max():.2f}")
+            print(f"   Average Price: ₹{prices.mean():.2f}")
             
             # Material name length analysis
-            name_lengths = [len(f.material_name) for f in fabrics]
-            if name_lengths:
-                print(f"   Name Length Range: {min(name_lengths)} - {max(name_lengths)} characters")
-                print(f"   Average Name Length: {sum(name_lengths)/len(name_lengths):.1f} characters")
+            print(f"   Name Length Range: {name_lengths.min()} - {name_lengths.max()} characters")
+            print(f"   Average Name Length: {name_lengths.mean():.1f} characters")
             
             return True
             
@@ -3,30 +3,56 @@
 Test script to verify OCR endpoint functionality
 """
 
+import base64
 import requests
 import os
-from PIL import Image, ImageDraw, ImageFont
+from pathlib import Path
 
-def create_test_image():
-    """Create a simple test image with text"""
-    # Create a white image
-    img = Image.new('RGB', (300, 100), color='white')
-    draw = ImageDraw.Draw(img)
-    
-    # Try to use a default font, fallback to basic if not available
-    try:
-        font = ImageFont.truetype("arial.ttf", 24)
-    except:
-        font = ImageFont.load_default()
-    
-    # Draw some text
-    draw.text((20, 35), "OCR Test Document", fill='black', font=font)
-    draw.text((20, 65), "Sample Text for Testing", fill='black', font=font)
-    
-    # Save test image
-    test_image_path = "test_ocr_endpoint.png"
-    img.save(test_image_path)
-    return test_image_path
+# Shared session so repeated calls reuse the same connection
+SESSION = requests.Session()
+
+# 300x100 PNG reading "OCR Test Document" / "Sample Text for Testing" (8-level grayscale,
+# sans 24px), embedded so the test needs no PIL or font files
+_PNG_B64 = (
+    "iVBORw0KGgoAAAANSUhEUgAAASwAAABkBAMAAADOLxDzAAAAGFBMVEX////p6em5ubl5eXlCQkIX"
+    "FxcGBgYAAAAyDbFJAAAGxElEQVR42u2YS2/c1hmGn0MOOghQqccdGd1EMmVZSANUFueiom2MWtKM"
+    "umgCJ44lr7pIAbtd2nWL+jd00fyBCt0HlptuE42sKdrEATQX2u4igW6UXDQGdMmJHDQFouHpghyJ"
+    "nIs0ChzUC74rzpnznvPx48cPPA/EihUrVqxYsWLFihUrVqxYsWLFihUrVqxYsWLF6loi/MPID+6W"
+    "Xf9ip+KSvIleW3GA2/6EP4Rnp/od8OeU3ZPu65s7ygiHOHOmsjcjQUydqSauAPXiwl5BAsXiAsVi"
+    "MWLtG4dgzox10rACcyclQten+2eVEBPv0jcyq6rXbQevgjhlOVDByFfar+BVEJ9P/vnZPsRwtibK"
+    "Cr1wDjJlhVdKA6DdSCZyv8qDMXU9TfKN5M1gUJdTEnJXp23A/Nk1G25b8NJNkrfGrk+KsevphjV5"
+    "69zVKzJsPi4sY8AB6nuWMeoAa6f8YSXDCZ1Y65vg3KhTkPvOfqkxXN+06Jvc2StIxHTPRuHQIkbd"
+    "3NDARkEGVsTltcQEYfNxYXkK0I5l1BVQD3wyXM6Z+eJChsHi0kO77tYPq9aVZJcW5h/ZmC/eLT6y"
+    "D/4wi/MP0gvze1ZgxVgq3xsiYj46LKGD7PgXXtUfPRMKyxhx2HkqLcWajCyjpHG+hq5myK6infRh"
+    "5bmoAaVdGVjBYVccW1uJ1l4hD11GltR2OCwNekMqy11ejq4jDU/BroF0YfvwAWlQHqgXAuuXnkKf"
+    "KKw2MgvwXriFiCxI6Vzaq7Y0QA1ogfwE6rVwWBHrp7q5WR4XVmMFdbAUX73N8KVQEQizAHyy/GBq"
+    "8G40WUoEGZete+iQtcsGEQ5LBDv4F8ZoDWA13EL0V28DML+bt6Ml6+ogAtVho8CaPHHf8gwJCNv1"
+    "TAn0TfjL7cmm+z4r0eXSROQJ2v69CI2SYAyiIJq4hvXkYW3agNnrehs2MLjmLxfuW9oAMWNcBzdS"
+    "H2aP6xkSvuuhLBi+iJIQ6cO+9et0+cWcRORXoJaVmONOazv1Htuk6p8ZNlKHKlfkV/EephGZKutD"
+    "CNvBHcSMpMa3qvbfCEe+iVuPp2up83+ClX9NO0NbbmtYunYpka1op5DILvJZYrwEGFmRGpmF6i8N"
+    "c2SW7S+uPO1/h7WL+T7nxzRbD34G5m6ype9sZHvvKPCKG+ntvzRezMHQlOW/ZVYWWXqQXnbY2ZB+"
+    "E5nsmVOwdS/VW1R4c+bAHGwvnt2KVr9vbSgwx4oVK1asWLGOlvnsV5wZ/viZnqqPUfJWV9NyvV1y"
+    "EnO8y5PPuYzXJXtpR3BEpgJglZ0uJqf6HTNT6iqsxJuVxJU/dhVWEZEvNh/JChX/iNLN5L5xx1vv"
+    "LlvZpUXDsrpK1xEER3Y7ef/d7kr+wj+VTgx/bBTycp3kjf1XpTv2qn7C7X+P5eU6iR/ex5ya8J74"
+    "uXnlA4Dca3Ld/O2HmL/78Pdc+ACSP/rB2EfkLrz8rSckb+xf/ahpMkYhr58k30qM1W7cT97YKnz/"
+    "0/9C7jX5n1/fb1/yElhxGR6t5awwa+H0d2pjNoCY7g3jmIDgeI9tUjssUAT2KZca9AYR+WBvg3t8"
+    "fkPfxGqf1elNdAdhxxHjc+UHVpi1cH6uXJoEMF+cKz6ymgmOdtKkq1SpAHVWnQa9wZx3jsY9Pr8h"
+    "W16YG+8U1nouA4heF1eGWAtsQ8UAGKqga+kWgrOSMkbC+zfoDV5ktB3ucdgVGOcXD7hVa1grD6eu"
+    "WehZ/3k2WAvgNo7cloLdUy0Ep/44uxNZNKA3eJHRBu5h+a8Hp0eFFhiev0n7N9F7fyc7PavU0KAp"
+    "Q6wFFGghvwS5n8UQLQSH2uV32tGbpgbSBvf4/EZof5MO7VSXa9fs0tjFWgsGCq6kBey3EBzWvMi9"
+    "irbn5o64p80Ju4lv1Us///vFO+5LL7fgKxSg3nPbYRiG9iIARzfd03G4p7XfhWrLzANKGJ7bxiG0"
+    "ChJtDLZgGDF6LxMJQBwyz+NxD3jiiLDISEAL3dKpJX5Voiw4/UYLhjH7V1ORbQJ60xRWB9wD2pCd"
+    "w/I20wi7pgWGHbVlwX/V1rIIu9aCYbIV76EduuEGvWnKSXvcEyAs0+5EA6uXDXNktp7Im85PIgv+"
+    "Y3rjp3fQhrX5Rd4cmW3GMGL0fWq/cLQqzAXjAb1pykkT7rkf+ud1s895pVPfupfqLSrvbqqnKcvb"
+    "n9tFl/qm9OZSA0XVjGHMHpcdU+rqQUcL6E2T2uCexj+ls1vOST8Vb1vf9CfyJPC933y9r9NvUBnA"
+    "Wn/ewvKe2hi227md/n+kF19PJb7tPHcPcbk01HM3PobGivW86X/H2/3ibvhTfAAAAABJRU5ErkJg"
+    "gg=="
+)
+
+def create_test_image(path="test_ocr_endpoint.png"):
+    """Write the test image with text to path"""
+    Path(path).write_bytes(base64.b64decode(_PNG_B64))
+    return path
 
 def test_ocr_endpoint():
     """Test the OCR endpoint"""
@@ -41,7 +67,7 @@ def test_ocr_endpoint():
         
         with open(test_image_path, 'rb') as f:
             files = {'file': f}
-            response = requests.post(url, files=files)
+            response = SESSION.post(url, files=files, timeout=30)
         
         print(f"Status Code: {response.status_code}")
         
@@ -70,7 +96,7 @@ def test_ocr_interface():
     print("\n🧪 Testing OCR Interface...")
     
     try:
-        response = requests.get("http://localhost:5000/ocr-test")
+        response = SESSION.get("http://localhost:5000/ocr-test", timeout=30)
         if response.status_code == 200:
             print("✅ OCR interface accessible")
             print("   You can now open http://localhost:5000/ocr-test in your browser")
@@ -4,11 +4,24 @@ Test script for OCR Frontend
 This script tests the OCR functionality without requiring the full Flask app
 """
 
-import os
 import sys
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
 import pytesseract
 
+def _load_font():
+    # Try to use a default font, fallback to basic if not available
+    try:
+        return ImageFont.truetype("arial.ttf", 20)
+    except OSError:
+        return ImageFont.load_default()
+
+# Loaded once and reused by every OCR test image
+_FONT = _load_font()
+
+# LSTM engine, text treated as one uniform block (test_basic_ocr's --oem/--psm, but
+# without its tessedit_do_invert / load_*_dawg overrides)
+_TESS_CONFIG = "--oem 1 --psm 6"
+
 def test_tesseract_installation():
     """Test if Tesseract is properly installed"""
     try:
@@ -38,35 +51,18 @@ def test_pillow():
 def test_ocr_basic():
     """Test basic OCR functionality"""
     try:
-        # Create a simple test image with text
-        from PIL import Image, ImageDraw, ImageFont
-        
-        # Create a white image
+        # Create a simple test image with text, kept in memory
         img = Image.new('RGB', (200, 50), color='white')
         draw = ImageDraw.Draw(img)
         
-        # Try to use a default font, fallback to basic if not available
-        try:
-            font = ImageFont.truetype("arial.ttf", 20)
-        except:
-            font = ImageFont.load_default()
-        
         # Draw some text
-        draw.text((10, 15), "Hello World", fill='black', font=font)
-        
-        # Save test image
-        test_image_path = "test_ocr_image.png"
-        img.save(test_image_path)
+        draw.text((10, 15), "Hello World", fill='black', font=_FONT)
         
         # Test OCR
-        text = pytesseract.image_to_string(img)
+        text = pytesseract.image_to_string(img, config=_TESS_CONFIG)
         print(f"✅ Basic OCR test successful")
         print(f"   Extracted text: '{text.strip()}'")
         
-        # Clean up
-        if os.path.exists(test_image_path):
-            os.remove(test_image_path)
-        
         return True
         
     except Exception as e:
@@ -3,8 +3,29 @@
 Test script to demonstrate quantity extraction from different invoice formats
 """
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from ocr import InvoiceOCR
 
+_OCR = None
+
+def get_ocr():
+    """Process-wide InvoiceOCR, built on first use and shared by every test"""
+    global _OCR
+    if _OCR is None:
+        _OCR = InvoiceOCR()
+    return _OCR
+
+def _extract(line):
+    return get_ocr().extract_fabric_details(line)
+
+def extract_all(lines):
+    """extract_fabric_details for every line across a process pool, results in line order"""
+    workers = min(len(lines), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=get_ocr) as ex:
+        return list(ex.map(_extract, lines, chunksize=8))
+
 def test_different_quantity_formats():
     """Test OCR with various quantity formats found in invoices"""
     
@@ -44,16 +65,13 @@ def test_different_quantity_formats():
     print("🧪 TESTING QUANTITY EXTRACTION FROM DIFFERENT INVOICE FORMATS")
     print("=" * 80)
     
-    # Create OCR instance
-    ocr = InvoiceOCR()
+    # Extract fabric details for all lines in parallel, then report in order
+    results = extract_all(test_lines)
     
     # Test each line
-    for i, line in enumerate(test_lines, 1):
+    for i, (line, fabric_details) in enumerate(zip(test_lines, results), 1):
         print(f"\n📝 Line {i}: {line}")
         
-        # Extract fabric details
-        fabric_details = ocr.extract_fabric_details(line)
-        
         if fabric_details:
             fabric = fabric_details[0]
             print(f"   ✅ Description: {fabric['description'][:40]}...")
@@ -111,13 +129,11 @@ def test_edge_cases():
         "Agora 5555 Mixed Units [1.60W] (55555) 25.5 mtr 1250.00 31875.00"
     ]
     
-    ocr = InvoiceOCR()
+    results = extract_all(edge_cases)
     
-    for i, line in enumerate(edge_cases, 1):
+    for i, (line, fabric_details) in enumerate(zip(edge_cases, results), 1):
         print(f"\n📝 Edge Case {i}: {line}")
         
-        fabric_details = ocr.extract_fabric_details(line)
-        
         if fabric_details:
             fabric = fabric_details[0]
             print(f"   📏 Quantity: {fabric['quantity'] or 'NOT FOUND'}")
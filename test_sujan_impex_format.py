@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Test script for Sujan Impex item rows, including rows pdfplumber wraps so the
+HSN/Qty/Rate/Amount columns start the next line
+"""
+
+from test_basic_ocr import UniversalInvoiceParser
+
+# One item per line
+SUJAN_ONE_LINE_TEXT = """
+Agora 3787 Rayure Biege [1.60W] (59883) 55122990 1.40 Mtr 1,250.00 Mtr 1,750.00
+Agora 1208 Tandem Flame Marino [1.60W] (59753) 55122990 2.25 Mtr 1,250.00 Mtr 2,812.50
+"""
+
+# Same items, each wrapped after the description (the second one across a blank line)
+SUJAN_WRAPPED_TEXT = """
+Agora 3787 Rayure Biege [1.60W] (59883)
+55122990 1.40 Mtr 1,250.00 Mtr 1,750.00
+Agora 1208 Tandem Flame Marino [1.60W] (59753)
+
+55122990 2.25 Mtr 1,250.00 Mtr 2,812.50
+"""
+
+EXPECTED = [
+    ("Agora 3787 Rayure Biege [1.60W] (59883)", 1.4, 1250.0, 1750.0),
+    ("Agora 1208 Tandem Flame Marino [1.60W] (59753)", 2.25, 1250.0, 2812.5),
+]
+
+def parse(text):
+    """(name, quantity, rate, amount) of every Sujan Impex item in text"""
+    items = UniversalInvoiceParser()._parse_sujan_impex_format(text)
+    return [(f.material_name, f.quantity, f.rate, f.amount) for f in items]
+
+def test_sujan_impex_wrapped_rows():
+    """Wrapped rows parse to the same items as one-line rows"""
+    for label, text in (("one-line", SUJAN_ONE_LINE_TEXT), ("wrapped", SUJAN_WRAPPED_TEXT)):
+        items = parse(text)
+        print(f"{'✅' if items == EXPECTED else '❌'} {label}: {items}")
+        assert items == EXPECTED
+
+if __name__ == "__main__":
+    test_sujan_impex_wrapped_rows()
@@ -5,52 +5,57 @@ Handles CSV prefix naming, spelling variations, and number matching.
 """
 
 import csv
+import functools
 import re
+from collections import defaultdict
 from pathlib import Path
-from difflib import SequenceMatcher
+import numpy as np
+from rapidfuzz import fuzz, process, utils
 
+_DIGITS_RE = re.compile(r'\d+')
+
+# Substring of a cleaned name -> fabric brand, checked in this order
+_BRANDS = {
+    'agora': 'agora',
+    'sarom': 'sarom',
+    'homeddecor': 'homeddecor',
+    'home': 'homeddecor',
+    'ddecor': 'homeddecor',
+    'sujan': 'sujan',
+    'royal': 'royal',
+    'cassia': 'cassia',
+    'alesia': 'alesia',
+    'keiba': 'keiba'
+}
+
+class _NonWordDrop(dict):
+    """str.translate table deleting every non-word character (same set as \\W:
+    anything but letters, digits and _), filled in per code point on first use"""
+    def __missing__(self, c):
+        ch = chr(c)
+        self[c] = keep = c if ch.isalnum() or ch == '_' else None
+        return keep
+
+_NON_WORD_DROP = _NonWordDrop()
+
+@functools.lru_cache(maxsize=4096)
 def clean_fabric_name(name: str) -> str:
     """Clean fabric name by removing spaces, making lowercase, removing punctuation"""
     if not name:
         return ""
     
-    # Convert to lowercase
-    name = name.lower()
-    
-    # Remove all spaces
-    name = name.replace(" ", "")
-    
-    # Remove common punctuation except numbers
-    name = re.sub(r'[^\w\d]', '', name)
-    
-    return name
+    # Lowercase, then drop spaces and punctuation (keeping numbers) in one pass
+    return name.lower().translate(_NON_WORD_DROP)
 
 def extract_fabric_info(parsed_name: str) -> dict:
     """Extract fabric brand, name, and number from parsed name"""
     cleaned = clean_fabric_name(parsed_name)
     
-    # Try to identify fabric brand
-    brands = {
-        'agora': 'agora',
-        'sarom': 'sarom', 
-        'homeddecor': 'homeddecor',
-        'home': 'homeddecor',
-        'ddecor': 'homeddecor',
-        'sujan': 'sujan',
-        'royal': 'royal',
-        'cassia': 'cassia',
-        'alesia': 'alesia',
-        'keiba': 'keiba'
-    }
-    
-    brand_found = None
-    for brand_key, brand_name in brands.items():
-        if brand_key in cleaned:
-            brand_found = brand_name
-            break
+    # Try to identify fabric brand (first key in _BRANDS order wins)
+    brand_found = next((brand_name for brand_key, brand_name in _BRANDS.items() if brand_key in cleaned), None)
     
     # Extract numbers (fabric codes)
-    numbers = re.findall(r'\d+', cleaned)
+    numbers = _DIGITS_RE.findall(cleaned)
     
     return {
         'original': parsed_name,
@@ -60,6 +65,7 @@ def extract_fabric_info(parsed_name: str) -> dict:
         'has_brand': brand_found is not None
     }
 
+@functools.lru_cache(maxsize=4096)
 def remove_csv_prefix(name: str) -> str:
     """Remove common CSV prefixes like 'A - '"""
     # Remove "A - " prefix
@@ -67,13 +73,22 @@ def remove_csv_prefix(name: str) -> str:
         return name[4:]
     return name
 
-def calculate_similarity(str1: str, str2: str) -> float:
-    """Calculate string similarity using multiple methods"""
-    # SequenceMatcher similarity
-    seq_similarity = SequenceMatcher(None, str1, str2).ratio()
-    
-    # Character overlap similarity
-    char_overlap = len(set(str1) & set(str2)) / len(set(str1) | set(str2)) if str1 and str2 else 0
+@functools.lru_cache(maxsize=4096)
+def _char_mask(name: str) -> int:
+    """Bit ord(c) set for every character c in name (an exact character set as an int)"""
+    mask = 0
+    for ch in set(name):
+        mask |= 1 << ord(ch)
+    return mask
+
+def calculate_similarity(str1: str, str2: str, threshold: float = 0.0) -> float:
+    """Calculate string similarity using multiple methods (0.0 if it cannot reach threshold)"""
+    # Character overlap similarity (Jaccard on the character-set bitmasks)
+    if str1 and str2:
+        mask1, mask2 = _char_mask(str1), _char_mask(str2)
+        char_overlap = (mask1 & mask2).bit_count() / (mask1 | mask2).bit_count()
+    else:
+        char_overlap = 0
     
     # Word overlap similarity (if we can split)
     word_similarity = 0
@@ -84,116 +99,204 @@ def calculate_similarity(str1: str, str2: str) -> float:
             word_overlap = len(words1 & words2) / len(words1 | words2)
             word_similarity = word_overlap
     
+    # Sequence similarity (RapidFuzz Indel ratio, C++). The cutoff is the lowest
+    # ratio that could still reach threshold, less a hair for float rounding;
+    # below it fuzz.ratio bails out early and returns 0
+    seq_cutoff = (threshold - char_overlap * 0.3 - word_similarity * 0.2) * 200 - 1e-6
+    seq_similarity = fuzz.ratio(str1, str2, score_cutoff=max(seq_cutoff, 0)) / 100
+    if seq_cutoff > 0 and not seq_similarity:
+        return 0.0
+    
     # Weighted average
     return (seq_similarity * 0.5 + char_overlap * 0.3 + word_similarity * 0.2)
 
-def find_best_matches(parsed_name: str, csv_fabrics: list, threshold: float = 0.6) -> list:
-    """Find best matches using multiple matching strategies"""
-    matches = []
+def _trigrams(name: str) -> set:
+    """All 3-character substrings of name"""
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+def build_fabric_index(csv_fabrics: list) -> dict:
+    """Inverted indexes over csv_fabrics rows, used by find_best_matches to
+    visit only rows that can match by substring or number"""
+    by_clean = defaultdict(list)        # distinct cleaned_no_prefix -> rows sharing it
+    trigrams = defaultdict(set)         # trigram of cleaned_no_prefix -> rows
+    short_rows = []                     # cleaned_no_prefix too short for a trigram
+    numbers = defaultdict(set)          # number -> rows
+    number_suffixes = defaultdict(set)  # every suffix of every number -> rows
+    
+    for row, fabric in enumerate(csv_fabrics):
+        cleaned = fabric['cleaned_no_prefix']
+        by_clean[cleaned].append(row)
+        if len(cleaned) < 3:
+            short_rows.append(row)
+        for gram in _trigrams(cleaned):
+            trigrams[gram].add(row)
+        for num in fabric['numbers']:
+            numbers[num].add(row)
+        for suffix in fabric['number_suffixes']:
+            number_suffixes[suffix].add(row)
+    
+    return {
+        'clean_names': list(by_clean),
+        'clean_rows': list(by_clean.values()),
+        'trigrams': dict(trigrams),
+        'short_rows': short_rows,
+        'numbers': dict(numbers),
+        'number_suffixes': dict(number_suffixes),
+    }
+
+def _candidate_rows(parsed_cleaned: str, parsed_numbers: list, fuzzy_rows, index: dict) -> list:
+    """Rows that can match parsed_cleaned by any strategy, in CSV order"""
+    rows = set(fuzzy_rows)
+    rows.update(index['short_rows'])
+    
+    # Either substring direction shares every trigram of the shorter name
+    for gram in _trigrams(parsed_cleaned):
+        rows.update(index['trigrams'].get(gram, ()))
     
+    # CSV numbers ending with a parsed number, or equal to one of its suffixes
+    for parsed_num in parsed_numbers:
+        rows.update(index['number_suffixes'].get(parsed_num, ()))
+        for i in range(1, len(parsed_num)):
+            rows.update(index['numbers'].get(parsed_num[i:], ()))
+    
+    return sorted(rows)
+
+def _rank_matches(parsed_name: str, csv_fabrics: list, fuzzy_scores: dict, index: dict) -> list:
+    """Run the matching strategies for one parsed name, given its Strategy 2
+    scores by row, and return its deduplicated matches best first"""
     # Clean parsed name
     parsed_cleaned = clean_fabric_name(parsed_name)
     parsed_info = extract_fabric_info(parsed_name)
+    parsed_numbers = parsed_info['numbers']
+    # Two numbers match when one ends with the other, i.e. one is among the other's suffixes
+    parsed_number_set = set(parsed_numbers)
+    parsed_suffixes = {num[i:] for num in parsed_numbers for i in range(len(num))}
     
-    # Strategy 1: Direct substring matching (after removing CSV prefix)
-    for fabric in csv_fabrics:
-        csv_name = fabric['original_name']
-        csv_cleaned = fabric['cleaned_name']
-        
-        # Remove CSV prefix for comparison
-        csv_name_no_prefix = remove_csv_prefix(csv_name)
-        csv_cleaned_no_prefix = clean_fabric_name(csv_name_no_prefix)
+    # One pass over the CSV; each row yields its first matching strategy, and a
+    # fabric listed twice (same name and price) keeps the earliest strategy, then row
+    best_by_fabric = {}
+    
+    # Names under 3 characters have no trigrams to look up, so scan every row
+    if index is None or len(parsed_cleaned) < 3:
+        rows = range(len(csv_fabrics))
+    else:
+        rows = _candidate_rows(parsed_cleaned, parsed_numbers, fuzzy_scores, index)
+    
+    for row in rows:
+        fabric = csv_fabrics[row]
+        # Prefix-free names are precomputed at CSV load
+        csv_name_no_prefix = fabric['name_no_prefix']
+        csv_cleaned_no_prefix = fabric['cleaned_no_prefix']
+        match = None
         
+        # Strategy 1: Direct substring matching (after removing CSV prefix)
         # Check if parsed name is substring of CSV name (without prefix)
         if parsed_cleaned in csv_cleaned_no_prefix:
-            match_score = len(parsed_cleaned) / len(csv_cleaned_no_prefix) * 100
-            matches.append({
+            strategy = 0
+            match = {
                 'fabric': fabric,
                 'csv_name_no_prefix': csv_name_no_prefix,
                 'csv_cleaned_no_prefix': csv_cleaned_no_prefix,
-                'score': match_score,
+                'score': len(parsed_cleaned) / len(csv_cleaned_no_prefix) * 100,
                 'type': 'substring_no_prefix',
                 'method': 'Direct Substring (No Prefix)'
-            })
+            }
         
         # Check if CSV name (without prefix) is substring of parsed name
         elif csv_cleaned_no_prefix in parsed_cleaned:
-            match_score = len(csv_cleaned_no_prefix) / len(parsed_cleaned) * 100
-            matches.append({
+            strategy = 0
+            match = {
                 'fabric': fabric,
                 'csv_name_no_prefix': csv_name_no_prefix,
                 'csv_cleaned_no_prefix': csv_cleaned_no_prefix,
-                'score': match_score,
+                'score': len(csv_cleaned_no_prefix) / len(parsed_cleaned) * 100,
                 'type': 'reverse_substring_no_prefix',
                 'method': 'Reverse Substring (No Prefix)'
-            })
-    
-    # Strategy 2: Fuzzy matching with similarity threshold
-    for fabric in csv_fabrics:
-        csv_name = fabric['original_name']
-        csv_cleaned = fabric['cleaned_name']
+            }
         
-        # Remove CSV prefix for comparison
-        csv_name_no_prefix = remove_csv_prefix(csv_name)
-        csv_cleaned_no_prefix = clean_fabric_name(csv_name_no_prefix)
-        
-        # Calculate similarity
-        similarity = calculate_similarity(parsed_cleaned, csv_cleaned_no_prefix)
-        
-        if similarity >= threshold:
-            matches.append({
+        # Strategy 2: Fuzzy matching with similarity threshold
+        elif row in fuzzy_scores:
+            strategy = 1
+            match = {
                 'fabric': fabric,
                 'csv_name_no_prefix': csv_name_no_prefix,
                 'csv_cleaned_no_prefix': csv_cleaned_no_prefix,
-                'score': similarity * 100,
+                'score': fuzzy_scores[row],
                 'type': 'fuzzy',
-                'method': f'Fuzzy Match (Similarity: {similarity:.2f})'
-            })
-    
-    # Strategy 3: Number-based matching for fabrics with numbers
-    if parsed_info['numbers']:
-        for fabric in csv_fabrics:
-            csv_name = fabric['original_name']
+                'method': f'Fuzzy Match (Similarity: {fuzzy_scores[row] / 100:.2f})'
+            }
+        
+        # Strategy 3: Number-based matching for fabrics with numbers
+        elif not (parsed_number_set.isdisjoint(fabric['number_suffixes']) and
+                  parsed_suffixes.isdisjoint(fabric['numbers'])):
+            # First pair of numbers that match, for the method label
+            number_pair = next((parsed_num, csv_num)
+                               for parsed_num in parsed_numbers
+                               for csv_num in fabric['numbers']
+                               if parsed_num == csv_num or parsed_num.endswith(csv_num) or csv_num.endswith(parsed_num))
             csv_cleaned = fabric['cleaned_name']
             
-            # Extract numbers from CSV name
-            csv_numbers = re.findall(r'\d+', csv_name)
+            # Calculate base similarity
+            similarity = calculate_similarity(parsed_cleaned, csv_cleaned, 0.3)
             
-            # Check if any numbers match
-            for parsed_num in parsed_info['numbers']:
-                for csv_num in csv_numbers:
-                    if parsed_num == csv_num or parsed_num.endswith(csv_num) or csv_num.endswith(parsed_num):
-                        # Calculate base similarity
-                        similarity = calculate_similarity(parsed_cleaned, csv_cleaned)
-                        
-                        if similarity >= 0.3:  # Lower threshold for number matches
-                            matches.append({
-                                'fabric': fabric,
-                                'csv_name_no_prefix': remove_csv_prefix(csv_name),
-                                'csv_cleaned_no_prefix': csv_cleaned,
-                                'score': (similarity * 0.7 + 0.3) * 100,  # Boost score for number match
-                                'type': 'number_based',
-                                'method': f'Number Match ({parsed_num} = {csv_num})'
-                            })
-                            break
-                else:
-                    continue
-                break
+            if similarity >= 0.3:  # Lower threshold for number matches
+                strategy = 2
+                match = {
+                    'fabric': fabric,
+                    'csv_name_no_prefix': csv_name_no_prefix,
+                    'csv_cleaned_no_prefix': csv_cleaned,
+                    'score': (similarity * 0.7 + 0.3) * 100,  # Boost score for number match
+                    'type': 'number_based',
+                    'method': f'Number Match ({number_pair[0]} = {number_pair[1]})'
+                }
+        
+        if match is not None:
+            fabric_id = f"{fabric['original_name']}_{fabric['default_price']}"
+            kept = best_by_fabric.get(fabric_id)
+            if kept is None or strategy < kept[0]:
+                best_by_fabric[fabric_id] = (strategy, row, match)
     
-    # Remove duplicates and sort by score
-    unique_matches = []
-    seen_fabrics = set()
+    # Sort by score (descending); ties keep strategy, then CSV order
+    ranked = sorted(best_by_fabric.values(), key=lambda k: (-k[2]['score'], k[0], k[1]))
     
-    for match in matches:
-        fabric_id = f"{match['fabric']['original_name']}_{match['fabric']['default_price']}"
-        if fabric_id not in seen_fabrics:
-            unique_matches.append(match)
-            seen_fabrics.add(fabric_id)
+    return [match for _, _, match in ranked]
+
+def find_best_matches_batch(parsed_names: list, csv_fabrics: list, threshold: float = 0.6, index: dict = None) -> list:
+    """Find best matches for each of parsed_names (one list per name)
+
+    With an index from build_fabric_index, only candidate rows are visited."""
+    if not parsed_names:
+        return []
+    
+    # Strategy 2 scores for every name against every row in one C++ call
+    # (RapidFuzz WRatio, 0-100); scores under the cutoff come back as 0. With an
+    # index, each distinct cleaned name is scored once and shared by its rows
+    choices = index['clean_names'] if index else [f['cleaned_no_prefix'] for f in csv_fabrics]
+    cutoff = threshold * 100
+    score_matrix = process.cdist(
+        [clean_fabric_name(name) for name in parsed_names], choices,
+        scorer=fuzz.WRatio, processor=utils.default_process,
+        score_cutoff=cutoff, dtype=np.float64,
+    )
     
-    # Sort by score (descending)
-    unique_matches.sort(key=lambda x: x['score'], reverse=True)
+    results = []
+    for parsed_name, scores in zip(parsed_names, score_matrix):
+        fuzzy_scores = {}
+        for choice in np.flatnonzero(scores >= cutoff).tolist():
+            score = scores[choice].item()
+            if index:
+                for row in index['clean_rows'][choice]:
+                    fuzzy_scores[row] = score
+            else:
+                fuzzy_scores[choice] = score
+        results.append(_rank_matches(parsed_name, csv_fabrics, fuzzy_scores, index))
     
-    return unique_matches
+    return results
+
+def find_best_matches(parsed_name: str, csv_fabrics: list, threshold: float = 0.6, index: dict = None) -> list:
+    """Find best matches using multiple matching strategies"""
+    return find_best_matches_batch([parsed_name], csv_fabrics, threshold, index)[0]
+
 
 def search_fabric_database():
     """Ultimate fabric search with multiple matching strategies"""
@@ -208,23 +311,42 @@ def search_fabric_database():
     
     fabrics_data = []
     with open(csv_file, 'r', encoding='utf-8', errors='ignore') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            material_name = row.get('Material_name', '').strip()
-            category = row.get('Category', '').strip()
-            default_price = row.get('Default_purchase_price', '').strip()
-            supplier = row.get('Default supplier', '').strip()
+        reader = csv.reader(f)
+        
+        # Column positions resolved once from the header; as with DictReader, a
+        # repeated name keeps its last position and a missing column reads as ''
+        columns = {name: i for i, name in enumerate(next(reader, []))}
+        i_name = columns.get('Material_name')
+        i_cat = columns.get('Category')
+        i_price = columns.get('Default_purchase_price')
+        i_sup = columns.get('Default supplier')
+        
+        for row in reader if i_name is not None and i_cat is not None else ():
+            # Skip non-Fabric rows before touching any other column
+            if i_cat >= len(row) or row[i_cat].strip() != 'Fabric' or i_name >= len(row):
+                continue
+            material_name = row[i_name].strip()
+            default_price = row[i_price].strip() if i_price is not None and i_price < len(row) else ''
+            supplier = row[i_sup].strip() if i_sup is not None and i_sup < len(row) else ''
             
-            if material_name and category == 'Fabric':
+            if material_name:
                 cleaned_name = clean_fabric_name(material_name)
+                name_no_prefix = remove_csv_prefix(material_name)
+                numbers = tuple(_DIGITS_RE.findall(material_name))
                 fabrics_data.append({
                     'original_name': material_name,
                     'cleaned_name': cleaned_name,
                     'default_price': default_price,
-                    'supplier': supplier
+                    'supplier': supplier,
+                    # Derived once here instead of per query in find_best_matches
+                    'name_no_prefix': name_no_prefix,
+                    'cleaned_no_prefix': clean_fabric_name(name_no_prefix),
+                    'numbers': numbers,
+                    'number_suffixes': frozenset(num[i:] for num in numbers for i in range(len(num))),
                 })
     
     print(f"📊 Loaded {len(fabrics_data)} fabrics from CSV")
+    fabric_index = build_fabric_index(fabrics_data)
     
     # Test fabrics from invoices
     test_fabrics = [
@@ -238,7 +360,10 @@ def search_fabric_database():
     print(f"\n🔍 Testing {len(test_fabrics)} fabric names:")
     print("-" * 80)
     
-    for fabric_name in test_fabrics:
+    # Match every test name in one batch
+    all_matches = find_best_matches_batch(test_fabrics, fabrics_data, threshold=0.5, index=fabric_index)
+    
+    for fabric_name, matches in zip(test_fabrics, all_matches):
         print(f"\n📋 Testing: '{fabric_name}'")
         
         # Extract fabric info
@@ -247,9 +372,6 @@ def search_fabric_database():
         print(f"   Brand: {fabric_info['brand'] or 'Unknown'}")
         print(f"   Numbers: {fabric_info['numbers']}")
         
-        # Find best matches
-        matches = find_best_matches(fabric_name, fabrics_data, threshold=0.5)
-        
         if matches:
             print(f"   ✅ Found {len(matches)} matches:")
             for i, match in enumerate(matches[:5]):  # Show top 5